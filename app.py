@@ -1,97 +1,93 @@
-import os
+import os, time
 import streamlit as st
 import pandas as pd
-import yfinance as yf
-import feedparser, requests
+import feedparser
 from datetime import date, timedelta
 
-from utils import (
-    compute_risk_metrics, to_markdown_table,
-    compute_portfolio_returns, var_es, stress_scenarios, historical_worst_days
+from utils import compute_risk_metrics, compute_portfolio_returns, var_es, rolling_var_es, load_weights_csv
+from report import (
+    VAR_METHODS, model_var_es, metric_tables, correlation_tables, portfolio_tables, stress_tables, render_markdown
 )
-from filings import fetch_sec_filings_atom, fetch_asx_announcements
+from filings import fetch_sec_filings, fetch_asx_announcements
 from summarizer import summarize_urls
 from pdf_export import markdown_to_pdf_bytes
-from esg import fetch_esg_for_tickers
+from esg import fetch_esg_for_tickers, get_esg_store
+from price_store import get_store
+from orchestrator import SourceRunner
+from pipeline import StageCache, fingerprint
+from instrumentation import start as start_trace
+from streaming import RiskState, poll_bars, intraday_ann_factor, BARS_PER_DAY
+from http_client import http_get, get_client
+from summary_cache import get_summary_cache
+from scenarios import library_from_store, HISTORICAL_WINDOWS
+from montecarlo import default_workers
 
 st.set_page_config(page_title="AI Risk Report (Web) – EN", page_icon="🧾", layout="wide")
 st.title("🧾 AI Risk Report – Web (English)")
 st.caption("Low-cost data sources -> risk analytics -> one-click report (Markdown/PDF) with sources.")
 
-# Sidebar
-with st.sidebar:
+# Sidebar: report options sit in a form, so edits only take effect when Run/Refresh submits them
+with st.sidebar.form("report_options"):
     tickers = st.text_input("Tickers (comma-separated)", "AAPL,MSFT,GOOG")
     start = st.date_input("Start date", date.today() - timedelta(days=365))
     news_query = st.text_input("News query (Google News RSS)", "bank risk liquidity")
     fred_series = st.text_input("FRED series (optional)", "DGS10")
     fred_api = st.text_input("FRED API key (optional)", "")
-    sec_company = st.text_input("SEC company/CIK (optional)", "Microsoft")
+    sec_company = st.text_input("SEC company/ticker/CIK (optional)", "Microsoft")
     asx_code = st.text_input("ASX issuer code (optional)", "CBA")
     st.markdown("---")
     st.markdown("**Risk analytics**")
+    weights_file = st.file_uploader("Portfolio weights CSV (optional)", type="csv",
+                                    help="Wide: ticker column + one column per portfolio. "
+                                         "Long: portfolio, ticker, weight columns. Default: equal weight.")
+    weights_matrix, detail_portfolio = None, None
+    if weights_file is not None:
+        try:
+            weights_matrix = load_weights_csv(weights_file)
+        except (ValueError, pd.errors.ParserError) as e:
+            st.error(f"Weights CSV: {e}")
+    if weights_matrix is not None:
+        detail_portfolio = st.selectbox(f"Portfolio for VaR/stress detail ({weights_matrix.shape[1]} loaded)",
+                                        list(weights_matrix.columns))
     do_var = st.checkbox("Compute VaR/ES (historical)", value=True)
-    do_stress = st.checkbox("Stress scenarios (uniform shocks + worst days)", value=True)
+    var_window = st.number_input("Rolling VaR window (days)", min_value=20, max_value=2500, value=250, step=10)
+    var_method = st.selectbox("Model VaR/ES (in addition to historical)", VAR_METHODS)
+    mc_paths = st.number_input("Simulation paths", min_value=1_000, max_value=10_000_000, value=100_000, step=10_000)
+    mc_seed = st.number_input("Simulation seed", min_value=0, value=42, step=1)
+    shrink_cov = st.checkbox("Ledoit-Wolf shrunk covariance for model VaR", value=False)
+    do_stress = st.checkbox("Stress scenarios (shocks, historical replay + worst days)", value=True)
     st.markdown("---")
     st.markdown("**ESG (Yahoo Sustainability)**")
     do_esg = st.checkbox("Fetch ESG metrics", value=False)
     st.markdown("---")
     st.markdown("**LLM (optional)**")
     use_llm = st.checkbox("Summarize SEC/ASX with LLM", value=False)
+    llm_mode = st.radio("Long documents", ["Truncate (first 6,000 chars)", "Map-reduce (whole document)"])
+    llm_budget = st.number_input("Map-reduce input token budget per document", min_value=2_000,
+                                 max_value=400_000, value=24_000, step=2_000)
     openai_key = st.text_input("OpenAI API Key (optional)", type="password")
     st.caption("If empty, the app will try OPENAI_API_KEY environment variable.")
-    submit = st.button("Run")
+    submit = st.form_submit_button("Run")
+    refresh = st.form_submit_button("Refresh data",
+                                    help="Drop the cached report stages and run them again. Prices stored through "
+                                         "today and unexpired HTTP/ESG cache entries are still reused.")
+with st.sidebar:
+    st.markdown("**Live (intraday)**")
+    live = st.checkbox("Live mode: poll intraday bars", value=False,
+                       help="Keeps a running risk state for today's session and folds in only the new bars")
+    live_interval = st.selectbox("Bar interval", [k for k in BARS_PER_DAY if k in ("1m", "5m", "15m", "30m")])
+    live_every = st.number_input("Poll every (seconds)", min_value=10, max_value=900, value=60, step=10)
+    st.markdown("---")
+    show_diag = st.checkbox("Run diagnostics", value=False,
+                            help="Per-stage spans (wall time, bytes fetched, rows processed) with a JSON export")
 
 def fetch_prices(tickers: str, start):
-    import pandas as pd, yfinance as yf
-
     syms = [t.strip().upper() for t in tickers.split(",") if t.strip()]
     if not syms:
         return pd.DataFrame()
 
-    # auto_adjust=True returns already-adjusted prices under "Close"
-    data = yf.download(
-        syms,
-        start=str(start),
-        progress=False,
-        auto_adjust=True,
-        threads=False,
-    )
-
-    if data is None or data.empty:
-        return pd.DataFrame()
-
-    # If single column DataFrame or Series
-    if isinstance(data, pd.Series):
-        close = data.to_frame(name=syms[0])
-        return close
-
-    # Try simple flat columns first
-    if "Close" in data.columns:
-        close = data["Close"]
-    elif "Adj Close" in data.columns:
-        close = data["Adj Close"]
-    # Handle MultiIndex (level 0: field, level 1: ticker)
-    elif isinstance(data.columns, pd.MultiIndex):
-        lvl0 = set(data.columns.get_level_values(0))
-        if "Close" in lvl0:
-            close = data.xs("Close", axis=1, level=0, drop_level=True)
-        elif "Adj Close" in lvl0:
-            close = data.xs("Adj Close", axis=1, level=0, drop_level=True)
-        else:
-            # last fallback: pick the last level that looks like close
-            candidates = [k for k in lvl0 if k.lower().startswith("close")]
-            if candidates:
-                close = data.xs(candidates[0], axis=1, level=0, drop_level=True)
-            else:
-                raise KeyError(f"No Close/Adj Close in columns: {lvl0}")
-    else:
-        raise KeyError(f"Unexpected columns: {list(data.columns)}")
-
-    if isinstance(close, pd.Series):
-        close = close.to_frame()
-
-    # Clean up empty columns (e.g., invalid tickers)
-    close = close.dropna(how="all", axis=1)
+    # Read the on-disk store first; only missing tickers / trailing dates hit Yahoo
+    close = get_store().get(syms, start)
 
     if close.empty:
         raise ValueError("No usable close prices returned. Check tickers/date range or API throttling.")
@@ -105,7 +101,7 @@ def fetch_google_news(query: str):
     # Encode query so spaces and special chars are safe in the URL
     q = quote_plus(query)
     url = f"https://news.google.com/rss/search?q={q}"
-    feed = feedparser.parse(url)
+    feed = feedparser.parse(http_get(url, timeout=12, ttl=600).content)
     items = [(e.title, e.link) for e in feed.entries[:10]]
     return items, url
 
@@ -113,7 +109,7 @@ def fetch_fred(series_id, api_key):
     if not api_key:
         return None, None
     url = f"https://api.stlouisfed.org/fred/series/observations?series_id={series_id}&api_key={api_key}&file_type=json"
-    r = requests.get(url, timeout=12)
+    r = http_get(url, timeout=12, ttl=3600)
     try:
         js = r.json()
     except Exception:
@@ -127,149 +123,391 @@ def fetch_fred(series_id, api_key):
     df.index = pd.to_datetime(df.index)
     return df, url
 
-if submit:
-    with st.spinner("Fetching data and computing analytics..."):
-        prices = fetch_prices(tickers, start)
-        st.subheader("Prices (Adj. Close, auto-adjusted)")
-        st.dataframe(prices.tail())
-        st.line_chart(prices)
-
-
-        # Core metrics
-        metrics = compute_risk_metrics(prices)
-        ann_vol = metrics["ann_vol"].to_frame("Annualized Volatility")
-        sharpe = metrics["sharpe"].to_frame("Sharpe (naive)")
-        mdd = metrics["mdd"].to_frame("Max Drawdown")
-
-        col1, col2, col3 = st.columns(3)
-        with col1: st.dataframe(ann_vol)
-        with col2: st.dataframe(sharpe)
-        with col3: st.dataframe(mdd)
-
-        st.subheader("Correlation Matrix")
-        st.dataframe(metrics["corr"])
-
-        # Portfolio analytics
-        weights = None  # equal weight
-        port = compute_portfolio_returns(prices, weights)
-        if do_var:
-            st.subheader("Portfolio VaR/ES (Historical Simulation)")
-            var_df = var_es(port)
-            st.dataframe(var_df)
-        if do_stress:
-            st.subheader("Stress Scenarios")
-            st.markdown("Uniform price shocks and sample worst daily losses")
-            shocks_df = stress_scenarios(prices, weights)
-            st.dataframe(shocks_df)
-            worst_df = historical_worst_days(port, k=5)
-            st.dataframe(worst_df)
-
-        # News
-        news, news_url = fetch_google_news(news_query)
-        st.subheader("Top News (Google News RSS)")
-        for title, link in news:
-            st.markdown(f"- [{title}]({link})")
-
-        # FRED
-        fred_df, fred_url = fetch_fred(fred_series, fred_api)
-        if fred_df is not None:
-            st.subheader(f"FRED: {fred_series}")
-            st.line_chart(fred_df)
-
-        # SEC & ASX
-        sec_items, sec_url = ([], None)
+def live_panel(syms: list[str], interval: str, weights, var_window: int):
+    """Intraday risk for today's session; each poll only ingests the bars that arrived since the last one."""
+    sig = (tuple(syms), interval, fingerprint(weights), int(var_window), date.today())
+    live_state = st.session_state.get("live_state")
+    if live_state is None or live_state[0] != sig:
+        live_state = st.session_state["live_state"] = (sig, RiskState(
+            syms, weights=weights, ann_factor=intraday_ann_factor(interval), var_window=int(var_window)))
+    state = live_state[1]
+    st.subheader("Live (intraday)")
+    t0 = time.perf_counter()
+    try:
+        bars = poll_bars(syms, interval, since=state.last_ts)  # only bars since the last poll
+    except Exception as e:
+        st.warning(f"Live bars: {e}")
+        return
+    t1 = time.perf_counter()
+    new = state.update_many(bars)
+    t2 = time.perf_counter()
+    if not state.n_bars:
+        st.info("No completed intraday bars yet today.")
+        return
+    st.caption(f"{state.n_bars} {interval} bars up to {state.last_ts:%H:%M}, {new} new this poll "
+               f"(fetch {t1 - t0:.2f}s, state update {(t2 - t1) * 1e3:.1f} ms). Annualised from {interval} bars.")
+    tables = metric_tables(state.metrics())
+    c1, c2, c3, c4 = st.columns(4)
+    c1.dataframe(tables["ann_vol"])
+    c2.dataframe(tables["sharpe"])
+    c3.dataframe(tables["mdd"][["Max Drawdown"]])
+    c4.dataframe(state.var_es())
+
+# Stage cache survives reruns, so a Run after an option change only recomputes the stages that depend on it
+stages = StageCache(st.session_state.setdefault("stage_cache", {}))
+if refresh:
+    stages.clear()
+
+# The report follows the form as submitted by the last Run/Refresh. Any other rerun (live mode,
+# diagnostics) redraws that report from the stage cache and fetches or recomputes nothing.
+run_now = submit or refresh
+if run_now:
+    st.session_state["report_ready"] = True
+
+if st.session_state.get("report_ready"):
+    trace = start_trace()  # every span of this run, across the source threads
+    syms = [t.strip().upper() for t in tickers.split(",") if t.strip()]
+    if weights_matrix is not None:
+        # Tickers held by uploaded portfolios are fetched too
+        syms = list(dict.fromkeys(syms + list(weights_matrix.index)))
+    # Fixed placeholders so sections keep their order whichever source lands first
+    box = {name: st.container() for name in
+           ("live", "prices", "stress", "news", "fred", "sec", "asx", "summaries", "esg", "timings", "diagnostics", "report")}
+    sec_items, sec_url, asx_items, asx_url = [], None, [], None
+    news, news_url, fred_df, fred_url = [], None, None, None
+    sec_md, asx_md, esg_summaries = "", "", {}
+    prices, book, port, weights, library = None, None, None, None, None
+    shocks_df = worst_df = None
+    api_key_eff = openai_key or os.getenv("OPENAI_API_KEY")
+    summary_mode = "mapreduce" if llm_mode.startswith("Map-reduce") else "truncate"
+    summary_stats0 = get_summary_cache().snapshot()
+    keys, deps = {}, []  # source name -> (stage key, ttl); content keys of everything the report uses
+
+    with st.spinner("Fetching data and computing analytics..."), SourceRunner() as runner:
+        def submit_stage(name, key, fn, *args, ttl=None, timeout=30.0, **kw) -> bool:
+            """Queue a source stage; False if it was skipped (not cached, and this rerun is not a Run)."""
+            keys[name] = (key, ttl)
+            hit, value = stages.lookup(key, stale_ok=not run_now)
+            if hit:
+                runner.complete(name, value)
+            elif run_now:
+                runner.submit(name, fn, *args, timeout=timeout, **kw)
+            else:
+                stages.record(name, "skip", 0.0, "waits for Run")  # e.g. failed last time: no refetch on redraw
+                return False
+            return True
+
+        def stress_section():
+            """Stress tables once both the price panel and the replay library are in."""
+            with box["stress"]:
+                st.subheader("Stress Scenarios")
+                st.markdown("Uniform, beta-scaled and historical-replay shocks (P&L %), "
+                            "and sample worst daily losses")
+                lib = library.reindex(columns=prices.columns).dropna(how="all")
+                stress_key = stages.key("stress", port_key, weights, lib)
+                out = stages.run("stress", stress_key, stress_tables, prices, port, weights, lib)
+                deps.append(stress_key)
+                not_replayed = [n for n in HISTORICAL_WINDOWS if f"Replay: {n}" not in lib.index]
+                if len(not_replayed) == len(HISTORICAL_WINDOWS):
+                    st.caption("No historical replays: Yahoo has no prices for these tickers "
+                               "in any replay window (2008-2022), or they have not been fetched yet.")
+                elif not_replayed:
+                    st.caption(f"Not replayed (no prices for these tickers then): {', '.join(not_replayed)}")
+                st.dataframe(out[0])
+                st.dataframe(out[1])
+            return out
+
+        submit_stage("prices", stages.key("prices", tuple(syms), str(start), date.today()),
+                     fetch_prices, ",".join(syms), start, ttl=900, timeout=120)
+        submit_stage("news", stages.key("news", news_query), fetch_google_news, news_query, ttl=600, timeout=15)
+        if fred_api:
+            submit_stage("fred", stages.key("fred", fred_series, fred_api), fetch_fred, fred_series, fred_api,
+                         ttl=3600, timeout=15)
         if sec_company:
-            sec_items, sec_url = fetch_sec_filings_atom(sec_company, count=10)
-            st.subheader("SEC Filings (Atom)")
-            if sec_items:
-                for it in sec_items:
-                    st.markdown(f"- [{it.get('title','filing')}]({it.get('link','')})")
-
-        asx_items, asx_url = ([], None)
+            submit_stage("sec", stages.key("sec", sec_company), fetch_sec_filings, sec_company, count=10,
+                         ttl=600, timeout=20)
         if asx_code:
-            asx_items, asx_url = fetch_asx_announcements(asx_code, limit=10)
-            st.subheader("ASX Announcements")
-            if asx_items:
-                for it in asx_items:
-                    st.markdown(f"- [{it['title']}]({it['link']})")
-
-        # Optional LLM summaries
-        sec_urls = [it.get("link","") for it in sec_items][:5] if sec_items else []
-        asx_urls = [it.get("link","") for it in asx_items][:5] if asx_items else []
-        if use_llm and (sec_urls or asx_urls):
-            st.subheader("AI Summaries (SEC/ASX)")
-            api_key_eff = openai_key or os.getenv("OPENAI_API_KEY")
-            sec_md = summarize_urls(sec_urls, api_key_eff, max_items=3) if sec_urls else ""
-            asx_md = summarize_urls(asx_urls, api_key_eff, max_items=3) if asx_urls else ""
-            if sec_md:
-                st.markdown("**SEC**")
-                st.markdown(sec_md)
-            if asx_md:
-                st.markdown("**ASX**")
-                st.markdown(asx_md)
-
-        # ESG (best-effort)
-        esg_summaries = {}
+            submit_stage("asx", stages.key("asx", asx_code), fetch_asx_announcements, asx_code, limit=10,
+                         ttl=600, timeout=20)
+        if do_stress:
+            # Replay windows are downloads of their own, so they run beside the other sources, not before them
+            if not submit_stage("replays", stages.key("replays", tuple(syms)), library_from_store, get_store(),
+                                syms, fetch=run_now, ttl=6 * 3600, timeout=90):
+                library = library_from_store(get_store(), syms, fetch=False)  # windows cached by earlier runs
         if do_esg:
-            syms = [t.strip().upper() for t in tickers.split(",") if t.strip()]
-            esg_map = fetch_esg_for_tickers(syms)
-            st.subheader("ESG Metrics (Yahoo Sustainability)")
-            for tk, df_esg in esg_map.items():
-                st.markdown(f"**{tk}**")
-                if df_esg is not None and not df_esg.empty:
-                    st.dataframe(df_esg)
-                    esg_summaries[tk] = df_esg.head(10)
+            submit_stage("esg", stages.key("esg", tuple(syms), date.today()), fetch_esg_for_tickers, syms,
+                         ttl=3600, timeout=90)
+
+        for res in runner.as_completed():
+            key, ttl = keys[res.name]
+            stages.record(res.name, "hit" if res.cached else "miss", res.elapsed, res.status)
+            if not res.ok:
+                with box["stress"] if res.name == "replays" else box.get(res.name.split("_")[0], box["summaries"]):
+                    st.warning(f"{res.name}: {res.error}")
+                if res.name == "replays":
+                    library = library_from_store(get_store(), syms, fetch=False)
+                    if port is not None:
+                        shocks_df, worst_df = stress_section()
+                continue
+            if not res.cached:
+                if res.name == "esg" and get_esg_store().last_stats.get("errors"):
+                    ttl = 60  # failed tickers are not in the ESG cache; let the next rerun retry them soon
+                stages.put(key, res.value, ttl)
+            value_fp = fingerprint(res.value)  # content, not fetch time: a refetch of the same data reuses the rest
+            deps.append(value_fp)
+
+            if res.name == "prices":
+                prices = res.value
+                prices_fp = value_fp
+                with box["prices"]:
+                    st.subheader("Prices (Adj. Close, auto-adjusted)")
+                    ps = get_store().last_stats
+                    if res.cached:
+                        st.caption("Prices: served from the stage cache (inputs unchanged)")
+                    else:
+                        st.caption(
+                            f"Price store: {'warm' if ps['warm'] else 'cold'} start in {ps['total_s']:.2f}s "
+                            f"({ps['tickers_fetched']}/{ps['tickers']} tickers fetched in {ps['batches']} batches, "
+                            f"{ps['bars_fetched']} bars fetched, {ps['bars_cached']} from cache)"
+                        )
+                    st.dataframe(prices.tail())
+                    st.line_chart(prices)
+
+                    # Core metrics
+                    metrics_key = stages.key("metrics", prices_fp)
+                    metrics = stages.run("metrics", metrics_key, compute_risk_metrics, prices)
+                    tables = metric_tables(metrics)
+
+                    col1, col2, col3 = st.columns(3)
+                    with col1: st.dataframe(tables["ann_vol"])
+                    with col2: st.dataframe(tables["sharpe"])
+                    with col3: st.dataframe(tables["mdd"])
+
+                    st.subheader("Correlation")
+                    corr_key = stages.key("correlation", prices_fp)
+                    corr_summary = stages.run("correlation", corr_key, correlation_tables, metrics)
+                    deps.append(corr_key)
+                    st.caption(f"Average pairwise correlation {corr_summary['avg_corr']:.3f} "
+                               f"across {len(tables['corr'])} tickers")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown("**Most correlated pairs**")
+                        st.dataframe(corr_summary["most"], hide_index=True)
+                    with col2:
+                        st.markdown("**Least correlated pairs**")
+                        st.dataframe(corr_summary["least"], hide_index=True)
+                    if not corr_summary["cluster_table"].empty:
+                        st.markdown("**Clusters (single linkage over the correlation MST)**")
+                        st.dataframe(corr_summary["cluster_table"])
+                    if len(tables["corr"]) <= 200:
+                        with st.expander("Full correlation matrix"):
+                            st.dataframe(tables["corr"])
+
+                    # Portfolio analytics
+                    if weights_matrix is not None:
+                        st.subheader(f"Portfolio Comparison ({weights_matrix.shape[1]} portfolios)")
+                        missing = sorted(set(weights_matrix.index) - set(prices.columns))
+                        if missing:
+                            st.warning(f"No prices for {', '.join(missing)}; their weights are treated as cash.")
+                        book_key = stages.key("portfolios", prices_fp, weights_matrix)
+                        book, book_worst = stages.run("portfolios", book_key, portfolio_tables, prices, weights_matrix)
+                        deps.append(book_key)
+                        st.dataframe(book)
+                        with st.expander("Worst daily returns per portfolio"):
+                            st.dataframe(book_worst)
+                    weights = None if weights_matrix is None else weights_matrix[detail_portfolio]  # None = equal weight
+                    port_key = stages.key("portfolio", prices_fp, weights)
+                    port = stages.run("portfolio", port_key, compute_portfolio_returns, prices, weights)
+                    if do_var:
+                        st.subheader("Portfolio VaR/ES (Historical Simulation)")
+                        var_key = stages.key("var_hist", port_key)
+                        var_df = stages.run("var_hist", var_key, var_es, port)
+                        st.dataframe(var_df)
+                        roll_key = stages.key("var_rolling", port_key, int(var_window))
+                        roll_df, backtest_df = stages.run("var_rolling", roll_key, rolling_var_es, port,
+                                                          window=int(var_window))
+                        if not roll_df.empty:
+                            st.markdown(f"Rolling {int(var_window)}-day VaR/ES vs next-day loss")
+                            st.line_chart(roll_df)
+                            st.dataframe(backtest_df)
+                        else:
+                            st.info(f"Not enough history for a {int(var_window)}-day rolling window.")
+                        model_key = stages.key("var_model", prices_fp, weights, var_method,
+                                               int(mc_paths), int(mc_seed), shrink_cov)
+                        model_var_df, model_stats = stages.run("var_model", model_key, model_var_es, var_method,
+                                                               metrics, weights, mc_paths, mc_seed,
+                                                               default_workers(), shrink_cov)
+                        deps += [var_key, roll_key, model_key]
+                        if model_var_df is not None:
+                            st.markdown(f"**{var_method}**")
+                            st.dataframe(model_var_df)
+                            if model_stats and "shrinkage" in model_stats:
+                                st.caption(f"Ledoit-Wolf shrinkage intensity {model_stats['shrinkage']:.3f}")
+                            if model_stats and "paths" in model_stats:
+                                st.caption(f"{model_stats['paths']:,} paths in {model_stats['runtime_s']:.2f}s "
+                                           f"({model_stats['paths_per_sec']:,} paths/sec, "
+                                           f"{model_stats['chunks']} chunks, {model_stats['workers']} workers)")
+                    if do_stress and library is not None:
+                        shocks_df, worst_df = stress_section()
+                    deps.append(metrics_key)
+
+            elif res.name == "replays":
+                library = res.value
+                if port is not None:
+                    shocks_df, worst_df = stress_section()
+
+            elif res.name == "news":
+                news, news_url = res.value
+                with box["news"]:
+                    st.subheader("Top News (Google News RSS)")
+                    for title, link in news:
+                        st.markdown(f"- [{title}]({link})")
+
+            elif res.name == "fred":
+                fred_df, fred_url = res.value
+                if fred_df is not None:
+                    with box["fred"]:
+                        st.subheader(f"FRED: {fred_series}")
+                        st.line_chart(fred_df)
+
+            elif res.name == "sec":
+                sec_items, sec_url = res.value
+                with box["sec"]:
+                    st.subheader("SEC Filings (EDGAR)")
+                    if sec_items:
+                        for it in sec_items:
+                            st.markdown(f"- [{it.get('title','filing')}]({it.get('link','')})")
+                # Optional LLM summaries start as soon as the filing list is known
+                sec_urls = [it.get("link","") for it in sec_items][:5] if sec_items else []
+                if use_llm and sec_urls:
+                    submit_stage("sec_summary", stages.key("sec_summary", tuple(sec_urls), api_key_eff,
+                                                           summary_mode, int(llm_budget)),
+                                 summarize_urls, sec_urls, api_key_eff, max_items=3,
+                                 mode=summary_mode, token_budget=int(llm_budget), timeout=180)
+
+            elif res.name == "asx":
+                asx_items, asx_url = res.value
+                with box["asx"]:
+                    st.subheader("ASX Announcements")
+                    if asx_items:
+                        for it in asx_items:
+                            st.markdown(f"- [{it['title']}]({it['link']})")
+                asx_urls = [it.get("link","") for it in asx_items][:5] if asx_items else []
+                if use_llm and asx_urls:
+                    submit_stage("asx_summary", stages.key("asx_summary", tuple(asx_urls), api_key_eff,
+                                                           summary_mode, int(llm_budget)),
+                                 summarize_urls, asx_urls, api_key_eff, max_items=3,
+                                 mode=summary_mode, token_budget=int(llm_budget), timeout=180)
+
+            elif res.name in ("sec_summary", "asx_summary"):
+                label = res.name.split("_")[0].upper()
+                if label == "SEC":
+                    sec_md = res.value
                 else:
-                    st.info("No ESG data available for this ticker.")
-
-        # Build markdown report
-        md_parts = []
-        md_parts.append(f"# Risk Report\n\n**Tickers:** {tickers}\n\n**Period Start:** {start}\n")
-        md_parts.append(to_markdown_table(ann_vol, "Annualized Volatility"))
-        md_parts.append(to_markdown_table(sharpe, "Sharpe (naive)"))
-        md_parts.append(to_markdown_table(mdd, "Max Drawdown"))
-        md_parts.append("### Correlation Matrix\n\n" + metrics["corr"].to_markdown() + "\n")
-        if do_var:
-            md_parts.append("\n## VaR / ES (Historical)\n")
-            md_parts.append(var_df.to_markdown() + "\n")
-        if do_stress:
-            md_parts.append("\n## Stress Scenarios\n")
-            md_parts.append(shocks_df.to_markdown() + "\n")
-            md_parts.append("\n**Worst Daily Returns**\n\n")
-            md_parts.append(worst_df.to_markdown() + "\n")
-        if do_esg and esg_summaries:
-            md_parts.append("\n## ESG Metrics (Yahoo Sustainability)\n")
-            for tk, df_esg in esg_summaries.items():
-                md_parts.append(f"\n**{tk}**\n")
-                md_parts.append(df_esg.to_markdown() + "\n")
-        if use_llm and (sec_urls or asx_urls):
-            md_parts.append("\n## Disclosure Summaries (AI)\n")
-            if sec_urls:
-                md_parts.append("\n**SEC**\n")
-                md_parts.append(sec_md + "\n")
-            if asx_urls:
-                md_parts.append("\n**ASX**\n")
-                md_parts.append(asx_md + "\n")
-
-        # Sources
-        md_parts.append("## Sources\n")
-        md_parts.append(f"- Yahoo Finance via `yfinance` for prices\n")
-        md_parts.append(f"- Google News RSS: {news_url}\n")
-        if fred_df is not None:
-            md_parts.append(f"- FRED API: {fred_url}\n")
-        if sec_items:
-            md_parts.append(f"- SEC EDGAR Atom: {sec_url}\n")
-        if asx_items:
-            md_parts.append(f"- ASX Announcements: {asx_url}\n")
-
-        report_md = "\n".join(md_parts)
+                    asx_md = res.value
+                with box["summaries"]:
+                    st.markdown(f"**AI Summary – {label}**")
+                    st.markdown(res.value)
+
+            elif res.name == "esg":
+                esg_map = res.value
+                with box["esg"]:
+                    st.subheader("ESG Metrics (Yahoo Sustainability)")
+                    es = get_esg_store().last_stats
+                    if res.cached:
+                        st.caption("ESG: served from the stage cache (inputs unchanged)")
+                    else:
+                        st.caption(
+                            f"ESG cache: {es['cache_hits']}/{es['tickers']} tickers cached "
+                            f"({es['cached_no_data']} known to have no data), {es['fetched']} fetched "
+                            f"({es['fetched_no_data']} without data), {len(es['errors'])} failed, "
+                            f"in {es['total_s']:.2f}s"
+                        )
+                    errors = {} if res.cached else es["errors"]
+                    for tk, df_esg in esg_map.items():
+                        st.markdown(f"**{tk}**")
+                        if df_esg is not None and not df_esg.empty:
+                            st.dataframe(df_esg)
+                            esg_summaries[tk] = df_esg.head(10)
+                        elif tk in errors:
+                            st.warning(f"ESG fetch failed ({errors[tk]}); it will be retried on the next run.")
+                        else:
+                            st.info("No ESG data available for this ticker.")
+
+        source_timings = runner.timings()
+        wall_time = runner.wall_time
+
+    if prices is None:
+        with box["report"]:
+            st.error("Prices could not be fetched, so no report was generated.")
+        st.stop()
+
+    sc = {k: v - summary_stats0[k] for k, v in get_summary_cache().snapshot().items()}
+
+    sources = []
+    if news_url:
+        sources.append(f"- Google News RSS: {news_url}")
+    if fred_df is not None:
+        sources.append(f"- FRED API: {fred_url}")
+    if sec_items:
+        sources.append(f"- SEC EDGAR: {sec_url}")
+    if asx_items:
+        sources.append(f"- ASX Announcements: {asx_url}")
+    looked_up = sc["hits"] + sc["misses"]
+    if (sec_md or asx_md) and looked_up:
+        sources.append(f"- LLM summary cache: {sc['hits']}/{looked_up} documents served from cache, "
+                       f"{sc['duplicate_urls']} duplicate URLs skipped")
+    sections = dict(tables, corr_summary=corr_summary, tickers=tickers, start=start, book=book, sec_md=sec_md, asx_md=asx_md,
+                    sources=sources, esg=esg_summaries if do_esg else {},
+                    detail_portfolio=detail_portfolio if weights_matrix is not None else None)
+    if do_var:
+        sections.update(var_df=var_df, model_var_df=model_var_df, model_stats=model_stats, var_method=var_method,
+                        var_window=int(var_window), backtest_df=backtest_df)
+    if do_stress and shocks_df is not None:
+        sections.update(shocks_df=shocks_df, worst_df=worst_df)
+
+    with box["report"]:
+        md_key = stages.key("markdown", tickers, str(start), do_var, do_stress, do_esg, var_method, detail_portfolio,
+                            int(var_window), sorted(deps), sc)
+        report_md = stages.run("markdown", md_key, render_markdown, sections)
         st.subheader("📄 Generated Markdown")
         st.code(report_md, language="markdown")
         st.download_button("Download report.md", data=report_md.encode("utf-8"), file_name="risk_report.md")
 
         # PDF export
-        pdf_bytes = markdown_to_pdf_bytes(report_md)
+        pdf_key = stages.key("pdf", md_key)
+        pdf_bytes = stages.run("pdf", pdf_key, markdown_to_pdf_bytes, report_md)
         st.download_button("Download report.pdf", data=pdf_bytes, file_name="risk_report.pdf", mime="application/pdf")
 
+    if live:
+        with box["live"]:
+            # A fragment reruns on its own timer, so polls never re-run the report above
+            st.experimental_fragment(live_panel, run_every=live_every)(
+                syms, live_interval, None if weights_matrix is None else weights_matrix[detail_portfolio],
+                int(var_window))
+
+    with box["timings"]:
+        st.subheader("Stage timings")
+        fetched = source_timings[source_timings["Status"] != "cached"]
+        st.caption(f"Sources: wall time {wall_time:.2f}s vs {fetched['Seconds'].sum():.2f}s if run one after another")
+        stage_df = stages.timings()
+        hits = int((stage_df["Cache"] == "hit").sum())
+        st.caption(f"Stage cache: {hits}/{len(stage_df)} stages reused from earlier runs, "
+                   f"{stage_df['Seconds'].sum():.2f}s recomputed")
+        st.dataframe(stage_df)
+        hc = get_client().cache_summary()
+        st.caption(f"HTTP cache: {hc['hit_rate']:.0%} hit rate ({hc['hits']} fresh, {hc['revalidated']} revalidated "
+                   f"/ {hc['requests']} requests), {hc['bytes_saved']/1e6:.2f} MB saved, "
+                   f"{hc['bytes_fetched']/1e6:.2f} MB fetched")
+
+    if show_diag:
+        with box["diagnostics"], st.expander("Run diagnostics", expanded=True):
+            st.caption("Spans of this run: wall time, bytes fetched over the network and rows processed. "
+                       "Sources run concurrently, so their times overlap.")
+            st.dataframe(trace.summary())
+            st.dataframe(trace.frame(), hide_index=True)
+            st.download_button("Download diagnostics.json", data=trace.to_json().encode("utf-8"),
+                               file_name="run_diagnostics.json", mime="application/json")
+
 else:
     st.info("Fill the sidebar and click **Run** to generate a report.")
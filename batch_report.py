@@ -0,0 +1,184 @@
+"""Headless batch risk reports: many ticker sets, one price fetch, a process pool of renderers.
+
+    python batch_report.py books.json --out reports --workers 8
+
+Config (JSON): `defaults` apply to every entry of `reports`.
+
+    {
+      "defaults": {"start": "2024-01-01", "var_window": 250, "var_method": "None", "pdf": true},
+      "reports": [
+        {"name": "growth", "tickers": ["AAPL", "MSFT"], "weights": {"AAPL": 0.7, "MSFT": 0.3}},
+        {"name": "banks", "tickers": "JPM,BAC,C", "start": "2023-01-01"},
+        {"name": "clients", "weights_csv": "clients.csv"}
+      ]
+    }
+"""
+import argparse, json, os, re, shutil, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from price_store import get_store
+from scenarios import library_from_store
+from report import analyze, render_markdown
+from pdf_export import markdown_to_pdf
+from utils import load_weights_csv
+
+DEFAULTS = {"start": None, "var_window": 250, "var_method": "None", "mc_paths": 100_000, "mc_seed": 42,
+            "var": True, "stress": True, "pdf": True}
+
+
+def load_config(path: str) -> list[dict]:
+    """Report specs with defaults applied, tickers upper-cased and weights parsed."""
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = {**DEFAULTS, **cfg.get("defaults", {})}
+    specs = []
+    for i, entry in enumerate(cfg.get("reports", [])):
+        spec = {**defaults, **entry}
+        tickers = spec.get("tickers") or []
+        if isinstance(tickers, str):
+            tickers = tickers.split(",")
+        tickers = [t.strip().upper() for t in tickers if t.strip()]
+        weights = None
+        if spec.get("weights_csv"):
+            weights = load_weights_csv(os.path.join(base, spec["weights_csv"]))
+        elif spec.get("weights"):
+            weights = pd.Series({k.strip().upper(): float(v) for k, v in spec["weights"].items()})
+        if weights is not None:
+            tickers = list(dict.fromkeys(tickers + list(weights.index)))
+        if not tickers:
+            raise ValueError(f"Report {i + 1} has no tickers.")
+        spec["tickers"], spec["weights"] = tickers, weights
+        spec["name"] = str(spec.get("name") or f"report_{i + 1}")
+        spec["start"] = date.fromisoformat(str(spec["start"])) if spec["start"] else date.today() - timedelta(days=365)
+        specs.append(spec)
+    return specs
+
+
+# -- worker side: the price panel is one read-only memory map shared by every process
+_panel: dict = {}
+
+
+def _init_worker(panel_path: str, dates: np.ndarray, columns: list[str], library: pd.DataFrame) -> None:
+    _panel.update(values=np.load(panel_path, mmap_mode="r"), dates=dates,
+                  pos={c: i for i, c in enumerate(columns)}, library=library)
+
+
+def _prices_for(tickers: list[str], start: date) -> pd.DataFrame:
+    cols = [t for t in tickers if t in _panel["pos"]]
+    r0 = int(np.searchsorted(_panel["dates"], np.datetime64(start, "D")))
+    block = _panel["values"][r0:, [_panel["pos"][c] for c in cols]]  # copies only this book's slice
+    return pd.DataFrame(block, index=pd.DatetimeIndex(_panel["dates"][r0:], name="Date"),
+                        columns=cols).dropna(how="all")
+
+
+def _render(spec: dict, out_dir: str) -> dict:
+    t0 = time.perf_counter()
+    prices = _prices_for(spec["tickers"], spec["start"])
+    if prices.empty:
+        raise ValueError("no prices for any ticker")
+    r = analyze(prices, spec["weights"], var_window=spec["var_window"], var_method=spec["var_method"],
+                mc_paths=spec["mc_paths"], mc_seed=spec["mc_seed"], do_var=spec["var"],
+                do_stress=spec["stress"], library=_panel["library"])
+    r.update(tickers=",".join(spec["tickers"]), start=spec["start"])
+    missing = sorted(set(spec["tickers"]) - set(prices.columns))
+    if missing:
+        r["sources"] = [f"- No prices for: {', '.join(missing)}"]
+    report_md = render_markdown(r)
+
+    stem = os.path.join(out_dir, re.sub(r"[^\w.-]+", "_", spec["name"]))
+    with open(stem + ".md", "w", encoding="utf-8") as f:
+        f.write(report_md)
+    pdf_bytes = 0
+    if spec["pdf"]:
+        markdown_to_pdf(report_md, stem + ".pdf")  # written straight to the file, no in-memory copy
+        pdf_bytes = os.path.getsize(stem + ".pdf")
+    return {"name": spec["name"], "tickers": len(prices.columns), "seconds": round(time.perf_counter() - t0, 3),
+            "md_bytes": len(report_md.encode("utf-8")), "pdf_bytes": pdf_bytes}
+
+
+# -- driver -----------------------------------------------------------------
+def run_batch(specs: list[dict], out_dir: str = "reports", workers: int | None = None, store=None) -> dict:
+    """Fetch the union of all tickers once, then render every report in a process pool.
+
+    Workers map the price panel from a temporary `.npy` file instead of
+    receiving pickled DataFrames. Failed reports are listed, not raised.
+    """
+    t0 = time.perf_counter()
+    store = store or get_store()
+    union = list(dict.fromkeys(t for s in specs for t in s["tickers"]))
+    prices = store.get(union, min(s["start"] for s in specs))
+    if prices.empty:
+        raise ValueError("No prices returned for any ticker in the config.")
+    library = library_from_store(store, list(prices.columns))
+    t_fetch = time.perf_counter() - t0
+
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(specs)))
+    rows, failed = [], []
+    tmp = tempfile.mkdtemp(prefix="risk_panel_")
+    try:
+        panel_path = os.path.join(tmp, "panel.npy")
+        np.save(panel_path, prices.to_numpy(dtype=np.float64, na_value=np.nan))
+        initargs = (panel_path, prices.index.values.astype("M8[D]"), list(prices.columns), library)
+        t1 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            futs = {pool.submit(_render, spec, out_dir): spec["name"] for spec in specs}
+            for fut in as_completed(futs):
+                try:
+                    rows.append(fut.result())
+                except Exception as e:
+                    failed.append({"name": futs[fut], "error": f"{type(e).__name__}: {e}"})
+        t_render = time.perf_counter() - t1
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    total = time.perf_counter() - t0
+    return {
+        "reports": len(rows),
+        "failed": failed,
+        "tickers": len(union),
+        "workers": workers,
+        "price_store": store.last_stats,
+        "fetch_s": round(t_fetch, 3),
+        "render_s": round(t_render, 3),
+        "total_s": round(total, 3),
+        "reports_per_min": round(len(rows) / total * 60, 1) if total else 0.0,
+        "render_reports_per_min": round(len(rows) / t_render * 60, 1) if t_render else 0.0,
+        "rows": sorted(rows, key=lambda r: r["name"]),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Render risk reports for every ticker set in a JSON config.")
+    ap.add_argument("config")
+    ap.add_argument("--out", default="reports")
+    ap.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    ap.add_argument("--no-pdf", action="store_true", help="write Markdown only")
+    ap.add_argument("--stats", help="also write the run statistics to this JSON file")
+    args = ap.parse_args(argv)
+
+    specs = load_config(args.config)
+    if args.no_pdf:
+        for s in specs:
+            s["pdf"] = False
+    stats = run_batch(specs, args.out, args.workers)
+
+    for f in stats["failed"]:
+        print(f"FAILED {f['name']}: {f['error']}", file=sys.stderr)
+    print(f"{stats['reports']}/{len(specs)} reports for {stats['tickers']} tickers in {stats['total_s']:.1f}s "
+          f"(prices {stats['fetch_s']:.1f}s, render {stats['render_s']:.1f}s on {stats['workers']} workers): "
+          f"{stats['reports_per_min']:,.0f} reports/min overall, "
+          f"{stats['render_reports_per_min']:,.0f} reports/min rendering")
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2, default=str)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Compare the old BeautifulSoup text extraction with the streaming extractor.
+
+    python benchmarks/bench_html_extract.py                 # synthetic 5 MB filing
+    python benchmarks/bench_html_extract.py saved/*.htm     # saved EDGAR documents
+
+Reports wall time and tracemalloc peak for: the old path (full download in
+memory + html.parser tree + slice), streaming with the default 20,000-char cap,
+and streaming the whole document.
+"""
+import argparse, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bs4 import BeautifulSoup
+from html_extract import decode_chunks, extract_text
+
+CHUNK = 64 * 1024
+
+
+def synthetic_filing(mb: float) -> bytes:
+    """EDGAR-like inline-XBRL soup: styled divs, tables and a little script."""
+    row = ('<tr><td style="padding:2px;font-family:Times New Roman">Revenue segment {i}</td>'
+           '<td style="text-align:right">{v:,}</td><td><ix:nonFraction name="us-gaap:Revenue">{v}</ix:nonFraction>'
+           '</td></tr>\n')
+    para = ('<div style="margin-top:6pt"><span style="font-size:10pt">Item 1A. Risk Factors. Our liquidity '
+            'could be adversely affected by covenant breaches, rate volatility and litigation {i}.</span></div>\n')
+    parts = ["<html><head><style>td{font:10pt serif}</style><script>var x=1;</script></head><body>"]
+    size, i = 0, 0
+    while size < mb * 2**20:
+        block = para.format(i=i) + "<table>" + "".join(row.format(i=j, v=j * 1013) for j in range(20)) + "</table>"
+        parts.append(block)
+        size += len(block)
+        i += 1
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def chunks_of(data: bytes):
+    for i in range(0, len(data), CHUNK):
+        yield data[i:i + CHUNK]
+
+
+def old_path(data: bytes, max_len: int) -> str:
+    soup = BeautifulSoup(b"".join(chunks_of(data)).decode("utf-8", errors="replace"), "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.extract()
+    return " ".join(soup.get_text(separator=" ").split())[:max_len]
+
+
+def streaming(data: bytes, max_len):
+    return extract_text(decode_chunks(chunks_of(data), {"Content-Type": "text/html; charset=utf-8"}), max_len)
+
+
+def measure(fn, *args) -> tuple[float, float, int]:
+    """Wall time from an untraced run; peak memory from a second, traced run."""
+    t0 = time.perf_counter()
+    out = fn(*args)
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dt, peak / 2**20, len(out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--mb", type=float, default=5.0)
+    ap.add_argument("--max-len", type=int, default=20000)
+    args = ap.parse_args()
+
+    docs = [(f, open(f, "rb").read()) for f in args.files] or [(f"synthetic {args.mb:g} MB", synthetic_filing(args.mb))]
+    for name, data in docs:
+        print(f"{name} ({len(data) / 2**20:.1f} MB)")
+        for label, fn, ml in (("bs4 html.parser (old)", old_path, args.max_len),
+                              (f"streaming, max_len={args.max_len}", streaming, args.max_len),
+                              ("streaming, whole document", streaming, None)):
+            dt, peak, n = measure(fn, data, ml)
+            print(f"  {label:<32} {dt:8.3f}s  peak {peak:8.1f} MB  {n:>10,} chars")
+
+
+if __name__ == "__main__":
+    main()
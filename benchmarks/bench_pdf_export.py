@@ -0,0 +1,139 @@
+"""Compare the old line-by-line monospace PDF export with the block renderer in pdf_export.
+
+    python benchmarks/bench_pdf_export.py --pages 1000
+
+Legacy pages are raw Markdown in Courier, so they hold less than a laid-out
+page; MB of Markdown per second compares the two on the same input.
+
+Each case runs in a fresh interpreter so peak RSS (minus the RSS once the
+input is built) belongs to that case alone. Cases: the old implementation
+(BytesIO + bytes copy), the new renderer returning bytes, and the new renderer
+writing straight to a file.
+"""
+import argparse, json, os, re, resource, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_report(sections: int) -> str:
+    """Report-shaped Markdown: headings, paragraphs, bullets and numeric tables."""
+    parts = ["# Risk Report\n\n**Tickers:** synthetic\n"]
+    for s in range(sections):
+        parts.append(f"## Book {s}\n\nAnnualised figures for the synthetic book; values are illustrative.\n")
+        parts.append("|      |   VaR@95 |   ES@95 |   VaR@99 |   ES@99 |   Max Drawdown | Peak       |\n"
+                     "|:-----|---------:|--------:|---------:|--------:|---------------:|:-----------|\n")
+        parts.append("".join(f"| T{s}_{i} | {0.01 + i * 1e-4:.6f} | {0.013 + i * 1e-4:.6f} | {0.02 + i * 1e-4:.6f} "
+                             f"| {0.024 + i * 1e-4:.6f} | {-0.2 - i * 1e-3:.6f} | 2024-0{1 + i % 9}-15 |\n"
+                             for i in range(25)))
+        parts.append("\n- Source: synthetic panel\n- Method: historical simulation\n")
+    return "\n".join(parts)
+
+
+def legacy_markdown_to_pdf_bytes(md_text: str) -> bytes:
+    """The previous pdf_export implementation, kept here for comparison."""
+    from io import BytesIO
+    import textwrap
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import cm
+    bio = BytesIO()
+    c = canvas.Canvas(bio, pagesize=A4)
+    width, height = A4
+    x, top = 2*cm, height - 2*cm
+    y = top
+    for raw_line in md_text.splitlines():
+        line = raw_line.replace("\t", "    ")
+        for wline in textwrap.wrap(line, width=95) or [""]:
+            if y <= 2*cm:
+                c.showPage()
+                y = top
+            c.setFont("Courier", 9)
+            c.drawString(x, y, wline)
+            y -= 12
+    c.showPage()
+    c.save()
+    bio.seek(0)
+    return bio.read()
+
+
+def _rss_mb() -> float:
+    """Peak RSS so far (VmHWM on Linux, which `_reset_peak` can rewind; ru_maxrss elsewhere)."""
+    try:
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) / 1024.0
+    except (OSError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _reset_peak() -> None:
+    """Start the peak from the current RSS, so building the input Markdown is not counted."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def run_case(case: str, sections: int) -> dict:
+    from pdf_export import markdown_to_pdf, markdown_to_pdf_bytes
+    md = synthetic_report(sections)
+    _reset_peak()
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    if case == "legacy":
+        data = legacy_markdown_to_pdf_bytes(md)
+        size = len(data)
+    elif case == "bytes":
+        data = markdown_to_pdf_bytes(md)
+        size = len(data)
+    else:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            path = f.name
+        markdown_to_pdf(md, path)
+        size = os.path.getsize(path)
+        os.remove(path)
+    seconds = time.perf_counter() - t0
+    return {"case": case, "seconds": seconds, "bytes": size, "peak_rss_mb": _rss_mb() - base,
+            "pages": _count_pages(case, md)}
+
+
+def _count_pages(case: str, md: str) -> int:
+    from pdf_export import parse_blocks, PdfRenderer
+    if case == "legacy":
+        import textwrap
+        lines = sum(len(textwrap.wrap(ln.replace("\t", "    "), width=95) or [""]) for ln in md.splitlines())
+        per_page = int((841.89 - 4 * 28.3465) // 12) + 1
+        return -(-lines // per_page)
+    r = PdfRenderer(os.devnull)
+    for kind, payload in parse_blocks(md):
+        r.draw(kind, payload)
+    return r.finish()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=1000, help="approximate length of the new renderer's output")
+    ap.add_argument("--case", help=argparse.SUPPRESS)
+    ap.add_argument("--sections", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.sections)))
+        return
+
+    sections = max(1, round(args.pages / 0.52))  # ~0.52 pages per synthetic section
+    md_mb = len(synthetic_report(sections).encode("utf-8")) / 1e6
+    print(f"{sections} sections, {md_mb:.2f} MB of synthetic report Markdown")
+    for case in ("legacy", "bytes", "file"):
+        out = subprocess.run([sys.executable, __file__, "--case", case, "--sections", str(sections)],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out)
+        print(f"{r['case']:>7}: {r['pages']:5d} pages in {r['seconds']:6.2f}s "
+              f"({r['pages'] / r['seconds']:6.1f} pages/s, {md_mb / r['seconds']:5.2f} MB md/s), "
+              f"{r['bytes'] / 1e6:6.2f} MB PDF, "
+              f"peak RSS +{r['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
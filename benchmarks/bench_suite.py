@@ -0,0 +1,170 @@
+"""Report stages on synthetic price panels of growing size, with network sources served by local fixtures.
+
+    python benchmarks/bench_suite.py                                  # default sizes
+    python benchmarks/bench_suite.py --sizes 250x20,2500x500 --json run.json
+    python benchmarks/bench_suite.py --baseline run.json              # flag spans slower than a saved run
+
+Everything runs under `instrumentation.tracing()`, so the rows are the same
+spans the app's Run diagnostics panel shows. For each (days x tickers) panel:
+`report.analyze` (the utils metrics, VaR, stress and a 20-portfolio
+comparison), `render_markdown` and `markdown_to_pdf_bytes`. The sources are
+timed once: a local HTTP server serves synthetic filings and an
+OpenAI-compatible chat endpoint, so `summarize_urls` (stream, extract,
+map-reduce) runs without the network. HTTP and summary caches live in a
+temporary directory and every document is unique, so each repeat is cold.
+"""
+import argparse, atexit, json, os, shutil, sys, tempfile, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TMP = tempfile.mkdtemp(prefix="risk_bench_")
+atexit.register(shutil.rmtree, TMP, True)
+os.environ["RISK_HTTP_CACHE"] = os.path.join(TMP, "http")
+os.environ["RISK_SUMMARY_CACHE"] = os.path.join(TMP, "summaries.sqlite")
+os.environ.setdefault("OPENAI_RPM", "100000")  # the fixture has no rate limit to respect
+os.environ.setdefault("OPENAI_TPM", "100000000")
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_metrics import synthetic_prices
+from bench_html_extract import synthetic_filing
+from instrumentation import tracing, span
+from report import analyze, render_markdown
+from pdf_export import markdown_to_pdf_bytes
+from summarizer import summarize_urls
+
+
+class Fixtures(BaseHTTPRequestHandler):
+    """GET /filing/<name>: a synthetic EDGAR-style document; POST .../chat/completions: a canned reply."""
+
+    filing = b""
+
+    def do_GET(self):
+        body = f"<p>Document {self.path}</p>".encode("utf-8") + self.filing
+        self._send(200, "text/html; charset=utf-8", body)
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = "- Liquidity risk noted.\n- Covenant headroom reduced.\n- Takeaway: monitor funding."
+        body = json.dumps({"id": "bench", "object": "chat.completion", "created": 0, "model": req["model"],
+                           "choices": [{"index": 0, "finish_reason": "stop",
+                                        "message": {"role": "assistant", "content": text}}],
+                           "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+        self._send(200, "application/json", body.encode("utf-8"))
+
+    def _send(self, status: int, ctype: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def synthetic_panel(days: int, tickers: int, seed: int = 0) -> pd.DataFrame:
+    px = synthetic_prices(days, tickers, seed)
+    return pd.DataFrame(px, index=pd.bdate_range("2010-01-04", periods=days, name="Date"),
+                        columns=[f"T{j:04d}" for j in range(tickers)])
+
+
+def run_panel(prices: pd.DataFrame, n_portfolios: int = 20, seed: int = 0) -> list[dict]:
+    """One traced pass of the analytics + report + PDF stages; returns the spans."""
+    rng = np.random.default_rng(seed)
+    W = pd.DataFrame(rng.dirichlet(np.ones(prices.shape[1]), n_portfolios).T, index=prices.columns,
+                     columns=[f"P{i}" for i in range(n_portfolios)])
+    with tracing() as trace:
+        with span("bench.analyze"):
+            r = analyze(prices, W, var_window=min(250, len(prices) // 2))
+        with span("bench.render_markdown"):
+            md = render_markdown(r)
+        with span("bench.markdown_to_pdf_bytes") as sp:
+            sp.add(bytes=len(markdown_to_pdf_bytes(md)))
+    return trace.to_records()
+
+
+def run_sources(base: str, docs: int, tag: str) -> list[dict]:
+    urls = [f"{base}/filing/{tag}-{i}.htm" for i in range(docs)]
+    with tracing() as trace:
+        with span("bench.summarize_urls"):
+            summarize_urls(urls, api_key="bench", max_items=docs, base_url=f"{base}/v1", mode="mapreduce",
+                           token_budget=12_000)
+    return trace.to_records()
+
+
+def totals(spans: list[dict]) -> dict:
+    """Seconds per span name (summed over calls)."""
+    out = {}
+    for s in spans:
+        out[s["name"]] = out.get(s["name"], 0.0) + s["seconds"]
+    return out
+
+
+def best_of(runs: list[list[dict]]) -> tuple[dict, dict]:
+    """Per span name: the fastest repeat's seconds, and rows/bytes of the last repeat."""
+    secs = [totals(r) for r in runs]
+    best = {k: min(t.get(k, float("inf")) for t in secs) for k in secs[-1]}
+    vol = {}
+    for s in runs[-1]:
+        v = vol.setdefault(s["name"], [0, 0])
+        v[0] += s["rows"]
+        v[1] += s["bytes"]
+    return best, vol
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="250x10,1000x100,2500x500", help="comma-separated DAYSxTICKERS panels")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--docs", type=int, default=3, help="fixture filings to fetch and summarise")
+    ap.add_argument("--filing-mb", type=float, default=1.0)
+    ap.add_argument("--json", help="write results (and the last repeat's spans) to this file")
+    ap.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown reported as a regression")
+    ap.add_argument("--min-delta", type=float, default=0.01, help="ignore slowdowns below this many seconds")
+    args = ap.parse_args()
+
+    results, spans = {}, {}
+    for size in args.sizes.split(","):
+        days, tickers = (int(x) for x in size.lower().split("x"))
+        prices = synthetic_panel(days, tickers)
+        runs = [run_panel(prices) for _ in range(args.repeat)]
+        results[size], vol = best_of(runs)
+        spans[size] = runs[-1]
+        print(f"\n{days} days x {tickers} tickers (best of {args.repeat})")
+        for name, sec in sorted(results[size].items(), key=lambda kv: -kv[1]):
+            print(f"  {name:<34} {sec:8.3f}s  rows {vol[name][0]:>10,}")
+
+    Fixtures.filing = synthetic_filing(args.filing_mb)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Fixtures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    runs = [run_sources(base, args.docs, f"r{i}") for i in range(args.repeat)]
+    server.shutdown()
+    results["sources"], vol = best_of(runs)
+    spans["sources"] = runs[-1]
+    print(f"\nsources: {args.docs} x {args.filing_mb:g} MB fixture filings, map-reduce (best of {args.repeat})")
+    for name, sec in sorted(results["sources"].items(), key=lambda kv: -kv[1]):
+        print(f"  {name:<34} {sec:8.3f}s  {vol[name][1] / 2**20:8.2f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "spans": spans}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base_results = json.load(f)["results"]
+        slower = [(case, name, old, results[case][name])
+                  for case, names in base_results.items() if case in results
+                  for name, old in names.items() if name in results[case]
+                  and results[case][name] > old * (1 + args.tolerance) and results[case][name] - old > args.min_delta]
+        print(f"\n{len(slower)} span(s) more than {args.tolerance:.0%} slower than {args.baseline}")
+        for case, name, old, new in slower:
+            print(f"  {case:<14} {name:<34} {old:8.3f}s -> {new:8.3f}s")
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
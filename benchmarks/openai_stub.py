@@ -0,0 +1,118 @@
+"""Local OpenAI-compatible stub for running the summarizer without the network.
+
+    python benchmarks/openai_stub.py                 # round-trip check; exits 1 on a mismatch
+    python benchmarks/openai_stub.py --serve 8765    # keep serving, then e.g.
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run app.py
+
+The stub answers POST .../chat/completions with a canned reply that quotes
+the source URL found in the prompt, and serves GET /doc/<name> as a small
+HTML filing. The check points OPENAI_BASE_URL at it, then verifies what the
+summarizer sends (path, key, model, messages, max_tokens) and what it gets
+back, both for `llm_summarize` and for the `summarize_urls` fetch + LLM
+pipeline. HTTP and summary caches go to a temporary directory.
+"""
+import argparse, atexit, json, os, re, shutil, sys, tempfile, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TMP = tempfile.mkdtemp(prefix="openai_stub_")
+atexit.register(shutil.rmtree, TMP, True)
+os.environ["RISK_HTTP_CACHE"] = os.path.join(TMP, "http")
+os.environ["RISK_SUMMARY_CACHE"] = os.path.join(TMP, "summaries.sqlite")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPLY = "- Liquidity risk noted.\n- Covenant headroom reduced.\n- Takeaway: monitor funding."
+
+
+class Stub(BaseHTTPRequestHandler):
+    requests: list = []  # (path, headers, JSON body) of every chat completion received
+
+    def do_GET(self):
+        name = self.path.rsplit("/", 1)[-1]
+        body = f"<html><body><h1>Filing {name}</h1><p>Item 1A. Risk factors: liquidity and covenants.</p>" \
+               f"<script>var ignored = 1;</script></body></html>".encode("utf-8")
+        self._send(200, "text/html; charset=utf-8", body)
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        Stub.requests.append((self.path, self.headers, req))
+        url = re.search(r"https?://\S+", req["messages"][-1]["content"])
+        text = REPLY + (f" ({url.group(0)})" if url else "")
+        body = json.dumps({"id": "stub", "object": "chat.completion", "created": 0, "model": req["model"],
+                           "choices": [{"index": 0, "finish_reason": "stop",
+                                        "message": {"role": "assistant", "content": text}}],
+                           "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+        self._send(200, "application/json", body.encode("utf-8"))
+
+    def _send(self, status: int, ctype: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check() -> list[str]:
+    """Round trip against the stub via OPENAI_BASE_URL; returns the failures."""
+    server = serve()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+    from summarizer import llm_summarize, summarize_urls
+    failures = []
+
+    def expect(cond: bool, what: str):
+        print(f"  {'ok  ' if cond else 'FAIL'} {what}")
+        if not cond:
+            failures.append(what)
+
+    print("llm_summarize")
+    url = "https://example.com/filing-1.htm"
+    out = llm_summarize("Liquidity tightened; covenant headroom fell to 5%.", url, "stub-key")
+    path, headers, req = Stub.requests[-1]
+    expect(path == "/v1/chat/completions", f"request path {path}")
+    expect(headers.get("Authorization") == "Bearer stub-key", "API key sent as bearer token")
+    expect(req["model"] == "gpt-4o-mini" and req["max_tokens"] == 450, "model and max_tokens")
+    expect([m["role"] for m in req["messages"]] == ["system", "user"], "system + user messages")
+    expect("covenant headroom fell to 5%" in req["messages"][1]["content"], "document text in the prompt")
+    expect(out.startswith(REPLY) and url in out, "reply returned with the source URL")
+
+    print("summarize_urls (fetch + LLM)")
+    n = len(Stub.requests)
+    urls = [f"{base}/doc/a.htm", f"{base}/doc/b.htm"]
+    md = summarize_urls(urls, api_key="stub-key", max_items=2)
+    prompts = [r[2]["messages"][1]["content"] for r in Stub.requests[n:]]
+    expect(len(prompts) == 2, f"{len(prompts)} completions for 2 documents")
+    expect(all("Risk factors: liquidity" in p and "ignored" not in p for p in prompts), "extracted text sent")
+    expect(md.index(urls[0]) < md.index(urls[1]) and md.count(REPLY) == 2, "summaries in input order")
+    server.shutdown()
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--serve", type=int, metavar="PORT", help="serve until interrupted instead of checking")
+    args = ap.parse_args()
+    if args.serve is not None:
+        server = serve(args.serve)
+        print(f"OpenAI stub on http://127.0.0.1:{server.server_address[1]}/v1 (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+    failures = check()
+    print(f"\n{'all checks passed' if not failures else f'{len(failures)} check(s) failed'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+FULL_MATRIX_MAX = 15  # reports print the whole matrix only up to this many tickers
+
+
+def pairwise_corr(rets, block: int = 512, dtype=np.float32, min_periods: int = 2) -> np.ndarray:
+    """Pearson correlation over pairwise-complete observations, one (block x block) tile at a time.
+
+    Each column is centred on its own mean first so the float32 sums do not
+    cancel. Without gaps a tile is a single matrix product of standardised
+    returns; with gaps, per-pair counts and sums come from products with the
+    validity mask. Pairs with fewer than `min_periods` common days are NaN.
+    """
+    return _pairwise(rets, block, dtype, min_periods, cov=False)
+
+
+def pairwise_cov(rets, block: int = 512, dtype=np.float64, min_periods: int = 2) -> np.ndarray:
+    """Sample covariance over pairwise-complete observations (as `DataFrame.cov`), same tiled engine."""
+    return _pairwise(rets, block, dtype, min_periods, cov=True)
+
+
+def _pairwise(rets, block: int, dtype, min_periods: int, cov: bool) -> np.ndarray:
+    X = np.asarray(rets, dtype=dtype)
+    T, N = X.shape
+    M = ~np.isnan(X)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        X = X - np.nanmean(X, axis=0)
+    X[~M] = 0.0
+    out = np.empty((N, N), dtype=dtype)
+    if M.all():
+        with np.errstate(invalid="ignore", divide="ignore"):
+            Z = X / np.sqrt(T - 1.0) if cov else X / np.sqrt(np.einsum("ij,ij->j", X, X))
+        for i in range(0, N, block):
+            for j in range(i, N, block):
+                tile = Z[:, i:i + block].T @ Z[:, j:j + block]
+                out[i:i + block, j:j + block] = tile
+                out[j:j + block, i:i + block] = tile.T
+        if not cov:
+            np.clip(out, -1.0, 1.0, out=out)
+        if T < min_periods:
+            out[:] = np.nan
+        return out
+
+    Mf = M.astype(dtype)
+    X2 = None if cov else X * X
+    for i in range(0, N, block):
+        xi, mi = X[:, i:i + block], Mf[:, i:i + block]
+        for j in range(i, N, block):
+            xj, mj = X[:, j:j + block], Mf[:, j:j + block]
+            n = mi.T @ mj
+            sx, sy = xi.T @ mj, mi.T @ xj
+            sxy = xi.T @ xj
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if cov:
+                    tile = (n * sxy - sx * sy) / (n * (n - 1))
+                else:
+                    sxx, syy = X2[:, i:i + block].T @ mj, mi.T @ X2[:, j:j + block]
+                    tile = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+            tile[n < min_periods] = np.nan
+            out[i:i + block, j:j + block] = tile
+            out[j:j + block, i:i + block] = tile.T
+    if not cov:
+        np.clip(out, -1.0, 1.0, out=out)
+    return out
+
+
+def top_pairs(corr: np.ndarray, labels, k: int = 10) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(most correlated, least correlated) k distinct pairs."""
+    labels = np.asarray(labels)
+    iu, ju = np.triu_indices(len(labels), 1)
+    vals = corr[iu, ju]
+    ok = np.flatnonzero(~np.isnan(vals))
+    k = min(k, len(ok))
+
+    def table(order):
+        sel = ok[order]
+        return pd.DataFrame({"Ticker A": labels[iu[sel]], "Ticker B": labels[ju[sel]],
+                             "Corr": vals[sel].astype(float)})
+
+    if k == 0:
+        empty = table(np.array([], dtype=int))
+        return empty, empty.copy()
+    v = vals[ok]
+    hi = np.argpartition(-v, k - 1)[:k]
+    lo = np.argpartition(v, k - 1)[:k]
+    return table(hi[np.argsort(-v[hi])]), table(lo[np.argsort(v[lo])])
+
+
+def mst_edges(corr: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Minimum spanning tree over d = sqrt(2(1 - corr)) by Prim's algorithm, O(N^2) time and O(N) extra memory.
+
+    Returns (parent, child, distance) arrays of the N-1 edges. NaN pairs get
+    the maximum distance 2, so tickers without overlap join last.
+    """
+    N = len(corr)
+    in_tree = np.zeros(N, dtype=bool)
+    best = np.full(N, np.inf)
+    link = np.zeros(N, dtype=int)
+    parent, child, dist = np.empty(N - 1, int), np.empty(N - 1, int), np.empty(N - 1)
+    node = 0
+    for e in range(N - 1):
+        in_tree[node] = True
+        row = np.sqrt(np.clip(2.0 * (1.0 - np.asarray(corr[node], dtype=float)), 0.0, None))
+        row[np.isnan(row)] = 2.0
+        closer = ~in_tree & (row < best)
+        best[closer], link[closer] = row[closer], node
+        best[in_tree] = np.inf
+        node = int(np.argmin(best))
+        parent[e], child[e], dist[e] = link[node], node, best[node]
+    return parent, child, dist
+
+
+def clusters(corr: np.ndarray, labels, n_clusters: int | None = None, min_corr: float = 0.5) -> pd.Series:
+    """Single-linkage clusters from the MST: cut into `n_clusters`, or join chains with corr >= `min_corr`.
+
+    Returns cluster ids (1 = largest cluster) indexed by ticker.
+    """
+    N = len(labels)
+    root = np.arange(N)
+
+    def find(i):
+        while root[i] != i:
+            root[i] = root[root[i]]
+            i = root[i]
+        return i
+
+    if N > 1:
+        parent, child, dist = mst_edges(corr)
+        if n_clusters is not None:
+            keep = np.argsort(dist, kind="stable")[:max(0, N - n_clusters)]
+        else:
+            keep = np.flatnonzero(dist <= np.sqrt(2.0 * (1.0 - min_corr)))
+        for e in keep:
+            root[find(parent[e])] = find(child[e])
+    comp = np.array([find(i) for i in range(N)])
+    ids, inverse, counts = np.unique(comp, return_inverse=True, return_counts=True)
+    rank = np.empty(len(ids), dtype=int)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(1, len(ids) + 1)
+    return pd.Series(rank[inverse], index=pd.Index(labels, name="Ticker"), name="Cluster")
+
+
+def cluster_table(corr: np.ndarray, labels: pd.Series, max_members: int = 8) -> pd.DataFrame:
+    """Size, average within-cluster correlation and (first) members of each multi-ticker cluster.
+
+    Empty when every ticker is on its own.
+    """
+    rows = []
+    for cid, members in labels.groupby(labels):
+        idx = np.flatnonzero(labels.to_numpy() == cid)
+        if len(idx) < 2:
+            continue
+        sub = corr[np.ix_(idx, idx)]
+        avg = np.nanmean(sub[np.triu_indices(len(idx), 1)])
+        names = list(members.index[:max_members]) + (["..."] if len(idx) > max_members else [])
+        rows.append({"Cluster": cid, "Size": len(idx), "Avg Corr": float(avg), "Members": ", ".join(names)})
+    singles = int((labels.value_counts() == 1).sum())
+    if singles and rows:
+        rows.append({"Cluster": "singletons", "Size": singles, "Avg Corr": np.nan, "Members": ""})
+    return pd.DataFrame(rows, columns=["Cluster", "Size", "Avg Corr", "Members"]).set_index("Cluster")
+
+
+def ledoit_wolf(rets, dtype=np.float64) -> tuple[np.ndarray, float]:
+    """Ledoit-Wolf (2004) covariance shrunk toward a scaled identity -> (covariance, shrinkage in [0, 1]).
+
+    Missing returns count as the column mean (zero after demeaning).
+    """
+    X = np.asarray(rets, dtype=dtype)
+    X = X - np.nanmean(X, axis=0)
+    X[np.isnan(X)] = 0.0
+    T, N = X.shape
+    S = X.T @ X / T
+    mu = np.trace(S) / N
+    d2 = (np.sum(S * S) - 2 * mu * np.trace(S) + mu * mu * N) / N  # ||S - mu I||_F^2 / N
+    sq = np.einsum("ij,ij->i", X, X)
+    b2 = (np.sum(sq * sq) - T * np.sum(S * S)) / (T * T * N)  # mean ||x_t x_t' - S||_F^2 / T / N
+    shrink = float(min(max(b2, 0.0), d2) / d2) if d2 > 0 else 1.0
+    cov = (1.0 - shrink) * S
+    cov[np.diag_indices(N)] += shrink * mu
+    # Sample-covariance scaling (T - 1) to match pandas .cov()
+    return cov * T / max(T - 1, 1), shrink
+
+
+def correlation_summary(rets: pd.DataFrame, k: int = 10, n_clusters: int | None = None,
+                        min_corr: float = 0.5, corr: np.ndarray | None = None) -> dict:
+    """Compact correlation view: top/bottom pairs, MST clusters, average pairwise corr.
+
+    Pass `corr` if the matrix is already computed. The full matrix (`corr`,
+    float32 DataFrame) is returned too, for callers that show it when the
+    universe is small.
+    """
+    cols = list(rets.columns)
+    if corr is None:
+        corr = pairwise_corr(rets.to_numpy(dtype=np.float32, na_value=np.nan))
+    most, least = top_pairs(corr, cols, k)
+    labels = clusters(corr, cols, n_clusters, min_corr)
+    iu = np.triu_indices(len(cols), 1)
+    return {
+        "corr": pd.DataFrame(corr, index=cols, columns=cols),
+        "most": most,
+        "least": least,
+        "clusters": labels,
+        "cluster_table": cluster_table(corr, labels),
+        "avg_corr": float(np.nanmean(corr[iu])) if len(iu[0]) else float("nan"),
+        "min_corr": min_corr if n_clusters is None else None,
+    }
@@ -0,0 +1,123 @@
+import bisect, difflib, re, threading, time
+
+from http_client import http_get
+
+COMPANY_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
+SUBMISSIONS_URL = "https://data.sec.gov/submissions/CIK{cik:010d}.json"
+INDEX_TTL = 86400  # SEC regenerates company_tickers.json daily
+
+_SUFFIXES = {"inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+             "plc", "llc", "lp", "sa", "nv", "ag", "the"}
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case, punctuation-free company name without legal-form suffixes."""
+    words = re.sub(r"[^a-z0-9 ]+", " ", name.lower().replace("&", " and ")).split()
+    return " ".join(w for w in words if w not in _SUFFIXES)
+
+
+class EdgarIndex:
+    """Company/ticker -> CIK lookup built from SEC's company_tickers.json.
+
+    The JSON goes through the shared HTTP cache with a one-day TTL; the lookup
+    tables are rebuilt only when the downloaded file actually changes.
+    """
+
+    def __init__(self, headers: dict | None = None, ttl: float = INDEX_TTL):
+        self.headers = headers
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked_at = 0.0
+        self.by_ticker: dict[str, tuple[int, str]] = {}
+        self.by_cik: dict[int, tuple[str, str]] = {}
+        self._names: list[str] = []            # sorted normalised names
+        self._name_cik: dict[str, int] = {}
+
+    def load(self) -> "EdgarIndex":
+        if self._names and time.time() - self._checked_at < self.ttl:
+            return self
+        resp = http_get(COMPANY_TICKERS_URL, headers=self.headers, timeout=15, ttl=self.ttl)
+        resp.raise_for_status()
+        stamp = (len(resp.content), resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        with self._lock:
+            self._checked_at = time.time()
+            if stamp == self._stamp and self._names:
+                return self
+            by_ticker, by_cik, name_cik = {}, {}, {}
+            for row in resp.json().values():
+                cik, ticker, title = int(row["cik_str"]), row["ticker"].upper(), row["title"]
+                by_ticker[ticker] = (cik, title)
+                by_cik.setdefault(cik, (title, ticker))  # first listed ticker is the primary one
+                name_cik.setdefault(normalize_name(title), cik)
+            self.by_ticker, self.by_cik, self._name_cik = by_ticker, by_cik, name_cik
+            self._names = sorted(name_cik)
+            self._stamp = stamp
+        return self
+
+    def resolve(self, query: str) -> tuple[int, str] | None:
+        """(cik, company title) for a CIK, ticker, company name, name prefix or close misspelling."""
+        q = query.strip()
+        if not q:
+            return None
+        if q.isdigit():
+            cik = int(q)
+            return (cik, self.by_cik.get(cik, (q, ""))[0])
+        if q.upper() in self.by_ticker:
+            return self.by_ticker[q.upper()]
+        norm = normalize_name(q)
+        if not norm:
+            return None
+        if norm in self._name_cik:
+            cik = self._name_cik[norm]
+            return cik, self.by_cik[cik][0]
+        # prefix match: shortest matching name wins ("berkshire" -> "berkshire hathaway")
+        i = bisect.bisect_left(self._names, norm)
+        hits = []
+        while i < len(self._names) and self._names[i].startswith(norm):
+            hits.append(self._names[i])
+            i += 1
+        if not hits:
+            hits = difflib.get_close_matches(norm, self._names, n=1, cutoff=0.85)
+        if not hits:
+            return None
+        cik = self._name_cik[min(hits, key=len)]
+        return cik, self.by_cik[cik][0]
+
+    def resolve_many(self, queries: list[str]) -> dict[str, tuple[int, str] | None]:
+        return {q: self.resolve(q) for q in queries}
+
+
+def fetch_submissions(cik: int, count: int = 10, headers: dict | None = None, ttl: float = 600):
+    """Recent filings from the structured submissions JSON. Returns (items, url)."""
+    url = SUBMISSIONS_URL.format(cik=cik)
+    resp = http_get(url, headers=headers, timeout=12, ttl=ttl)
+    resp.raise_for_status()
+    recent = resp.json().get("filings", {}).get("recent", {})
+    forms = recent.get("form", [])
+    items = []
+    for i in range(min(count, len(forms))):
+        acc = recent["accessionNumber"][i]
+        doc = recent.get("primaryDocument", [""] * len(forms))[i]
+        desc = recent.get("primaryDocDescription", [""] * len(forms))[i]
+        label = f"{forms[i]} - {desc}" if desc and desc != forms[i] else forms[i]
+        folder = f"https://www.sec.gov/Archives/edgar/data/{cik}/{acc.replace('-', '')}"
+        items.append({
+            "title": f"{label} ({recent['filingDate'][i]})",
+            "link": f"{folder}/{doc}" if doc else f"{folder}/{acc}-index.htm",
+            "updated": recent["filingDate"][i],
+        })
+    return items, url
+
+
+_index: EdgarIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index(headers: dict | None = None) -> EdgarIndex:
+    """Process-wide index; re-checked against the HTTP cache once its TTL has passed."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = EdgarIndex(headers)
+    return _index.load()
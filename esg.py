@@ -1,23 +1,144 @@
-import yfinance as yf
+import json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from yfinance import data as yf_data
 import pandas as pd
 
+from instrumentation import span, traced, record, bind
+
+ESG_CACHE_DIR = os.getenv("RISK_ESG_CACHE", os.path.join(os.path.expanduser("~"), ".ai_risk_report", "esg"))
+DATA_TTL = 30 * 86400  # sustainability scores change at most monthly
+NO_DATA_TTL = 3 * 86400  # tickers Yahoo has no scores for are asked again after a few days
+
+# Yahoo's quoteSummary endpoint behind `yf.Ticker(t).sustainability`, called directly: yfinance >= 1.0
+# hides HTTP errors there (hide_exceptions) and returns an empty table, so throttling would look like no data
+QUOTE_SUMMARY_URL = "https://query2.finance.yahoo.com/v10/finance/quoteSummary"
+
+def _fetch(ticker: str) -> pd.DataFrame | None:
+    """Yahoo sustainability table, or None when Yahoo has none (404 or empty); other HTTP errors raise."""
+    params = {"modules": "esgScores", "formatted": "false", "corsDomain": "finance.yahoo.com", "symbol": ticker}
+    r = yf_data.YfData().get(f"{QUOTE_SUMMARY_URL}/{ticker}", params=params)  # shared session, cookie + crumb
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    result = (r.json().get("quoteSummary") or {}).get("result") or []
+    scores = result[0].get("esgScores") if result else None
+    if not scores:
+        return None
+    df = pd.DataFrame({"Value": pd.Series(scores, dtype=object)})
+    df.index.name = "Metric"
+    return df
+
 def fetch_esg_yahoo(ticker: str) -> pd.DataFrame | None:
     try:
-        t = yf.Ticker(ticker)
-        s = t.sustainability  # DataFrame for some tickers
-        if s is None or (hasattr(s, "empty") and s.empty):
-            return None
-        if isinstance(s, pd.DataFrame):
-            df = s.copy()
-            df.columns = ["Value"]
-            df.index.name = "Metric"
-            return df
-        return None
+        return _fetch(ticker)
     except Exception:
         return None
 
+class EsgStore:
+    """Per-ticker JSON cache of Yahoo ESG tables in front of a bounded thread pool.
+
+    Tables are kept for `data_ttl` seconds and "no data" answers for the
+    shorter `no_data_ttl`; failed requests are never cached, so they are
+    retried on the next call.
+    """
+
+    def __init__(self, root: str = ESG_CACHE_DIR, data_ttl: float = DATA_TTL, no_data_ttl: float = NO_DATA_TTL,
+                 max_workers: int = 8):
+        self.root = root
+        self.data_ttl = data_ttl
+        self.no_data_ttl = no_data_ttl
+        self.max_workers = max_workers
+        self.last_stats: dict = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.root, ticker.replace("/", "_") + ".json")
+
+    def _load(self, ticker: str, now: float) -> tuple[bool, pd.DataFrame | None]:
+        """(hit, table) from the cache; expired or unreadable entries are misses."""
+        try:
+            with open(self._path(ticker), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False, None
+        rows = entry.get("rows")
+        ttl = self.data_ttl if rows is not None else self.no_data_ttl
+        if now - entry.get("fetched", 0) > ttl:
+            return False, None
+        if rows is None:
+            return True, None
+        df = pd.DataFrame(rows, columns=["Metric", "Value"]).set_index("Metric")
+        return True, df
+
+    def _save(self, ticker: str, df: pd.DataFrame | None, now: float) -> None:
+        rows = None if df is None else [[str(k), v] for k, v in df["Value"].items()]
+        path = self._path(ticker)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ticker": ticker, "fetched": now, "rows": rows}, f, default=str)
+        os.replace(tmp, path)
+
+    @traced("esg.fetch")
+    def fetch(self, tickers: list[str]) -> dict[str, pd.DataFrame | None]:
+        """ESG table (or None) for every ticker, in input order; stats land in `last_stats`."""
+        t0 = time.perf_counter()
+        now = time.time()
+        tickers = list(dict.fromkeys(tickers))
+        out, misses = {}, []
+        hits = no_data_hits = 0
+        for tk in tickers:
+            hit, df = self._load(tk, now)
+            if hit:
+                out[tk] = df
+                hits += 1
+                no_data_hits += df is None
+            else:
+                misses.append(tk)
+
+        errors = {}
+
+        def one(tk):
+            try:
+                with span("esg.ticker", ticker=tk):
+                    df = _fetch(tk)
+            except Exception as e:
+                with self._lock:
+                    errors[tk] = f"{type(e).__name__}: {e}"
+                return None
+            try:
+                self._save(tk, df, time.time())
+            except OSError:
+                pass  # a read-only cache directory should not cost the data
+            return df
+
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(misses))) as pool:
+                for tk, df in zip(misses, pool.map(bind(one), misses)):
+                    out[tk] = df
+        fetched = [tk for tk in misses if tk not in errors]
+        record(rows=len(tickers), cache_hits=hits, errors=len(errors))
+        self.last_stats = {
+            "tickers": len(tickers),
+            "cache_hits": hits,
+            "cached_no_data": no_data_hits,
+            "fetched": len(fetched),
+            "fetched_no_data": sum(out[tk] is None for tk in fetched),
+            "errors": errors,
+            "total_s": round(time.perf_counter() - t0, 3),
+        }
+        return {tk: out[tk] for tk in tickers}
+
+_default_store: EsgStore | None = None
+_default_lock = threading.Lock()
+
+def get_esg_store() -> EsgStore:
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = EsgStore()
+        return _default_store
+
 def fetch_esg_for_tickers(tickers: list[str]) -> dict[str, pd.DataFrame | None]:
-    out = {}
-    for tk in tickers:
-        out[tk] = fetch_esg_yahoo(tk)
-    return out
+    return get_esg_store().fetch(tickers)
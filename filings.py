@@ -1,5 +1,10 @@
-import requests, feedparser
-from bs4 import BeautifulSoup
+import feedparser
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import http_get, get_client
+from html_extract import decode_chunks, iter_anchors
+from edgar_index import get_index, fetch_submissions
+from instrumentation import traced, record, bind
 
 UA = {"User-Agent": "your-email@example.com AI-Risk-Report-Demo"}  # Replace with your real contact email per SEC rules
 
@@ -8,8 +13,8 @@ def fetch_sec_filings_atom(company_or_cik: str, count: int = 10):
     url = ("https://www.sec.gov/cgi-bin/browse-edgar"
            f"?action=getcompany&company={company_or_cik}&owner=exclude&count={count}&output=atom")
     try:
-        resp = requests.get(url, headers=UA, timeout=12)
-        feed = feedparser.parse(resp.text)
+        resp = http_get(url, headers=UA, timeout=12, ttl=600)
+        feed = feedparser.parse(resp.content)
         items = [{
             "title": e.title,
             "link": e.link,
@@ -18,8 +23,8 @@ def fetch_sec_filings_atom(company_or_cik: str, count: int = 10):
         if not items:
             url2 = ("https://www.sec.gov/cgi-bin/browse-edgar"
                     f"?action=getcompany&CIK={company_or_cik}&owner=exclude&count={count}&output=atom")
-            resp2 = requests.get(url2, headers=UA, timeout=12)
-            feed2 = feedparser.parse(resp2.text)
+            resp2 = http_get(url2, headers=UA, timeout=12, ttl=600)
+            feed2 = feedparser.parse(resp2.content)
             items = [{
                 "title": e.title,
                 "link": e.link,
@@ -30,27 +35,62 @@ def fetch_sec_filings_atom(company_or_cik: str, count: int = 10):
     except Exception as e:
         return ([{"title": f"SEC fetch error: {e}", "link": "", "updated": ""}], url)
 
+@traced("filings.sec")
+def fetch_sec_filings(company_or_cik: str, count: int = 10):
+    """Recent SEC filings: resolve name/ticker/CIK locally, then one submissions-JSON request.
+
+    Falls back to the Atom search when the index is unavailable or the name is unknown.
+    Returns (items, url).
+    """
+    try:
+        hit = get_index(UA).resolve(company_or_cik)
+    except Exception:
+        hit = None
+    if hit is None:
+        items, url = fetch_sec_filings_atom(company_or_cik, count)
+    else:
+        try:
+            items, url = fetch_submissions(hit[0], count, headers=UA)
+        except Exception:
+            items, url = fetch_sec_filings_atom(str(hit[0]), count)
+    record(rows=len(items))
+    return items, url
+
+def fetch_sec_filings_batch(companies: list[str], count: int = 10, max_workers: int = 4) -> dict:
+    """`fetch_sec_filings` for many companies; the index is loaded once, requests share the SEC rate limit."""
+    try:
+        get_index(UA)
+    except Exception:
+        pass
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(companies, pool.map(bind(lambda c: fetch_sec_filings(c, count)), companies)))
+
+@traced("filings.asx")
 def fetch_asx_announcements(issuer_code: str, limit: int = 10):
     """Lightweight scrape of ASX announcements page; fallback to Google News RSS if structure changes."""
     base = "https://www2.asx.com.au/markets/trade-our-cash-market/announcements"
     try:
-        r = requests.get(base, timeout=12)
-        soup = BeautifulSoup(r.text, "html.parser")
+        status, headers, chunks = get_client().stream(base, timeout=12, ttl=600)
         items = []
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            txt = a.get_text(strip=True)
-            if issuer_code.upper() in (txt or "").upper() or issuer_code.upper() in href.upper():
-                if href.startswith("/"):
-                    href = "https://www2.asx.com.au" + href
-                items.append({"title": txt or "ASX announcement", "link": href})
-                if len(items) >= limit:
-                    break
+        try:
+            # Only anchors are parsed, and reading stops once `limit` matches are found
+            for href, txt in iter_anchors(decode_chunks(chunks, headers)):
+                if not href:
+                    continue
+                if issuer_code.upper() in (txt or "").upper() or issuer_code.upper() in href.upper():
+                    if href.startswith("/"):
+                        href = "https://www2.asx.com.au" + href
+                    items.append({"title": txt or "ASX announcement", "link": href})
+                    if len(items) >= limit:
+                        break
+        finally:
+            chunks.close()
         if not items:
             rss = f"https://news.google.com/rss/search?q=site:asx.com.au+{issuer_code}+announcement"
-            feed = feedparser.parse(rss)
+            feed = feedparser.parse(http_get(rss, timeout=12, ttl=600).content)
             for e in feed.entries[:limit]:
                 items.append({"title": e.title, "link": e.link})
+        record(rows=len(items))
         return items, base
     except Exception as e:
         return ([{"title": f"ASX fetch error: {e}", "link": ""}], base)
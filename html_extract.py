@@ -0,0 +1,115 @@
+import codecs
+from html.parser import HTMLParser
+from typing import Iterable, Iterator
+
+from requests.utils import get_encoding_from_headers
+
+SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+
+class _TextParser(HTMLParser):
+    """Collects visible text only; no tree is built.
+
+    Text runs are joined with a space at tag boundaries (like
+    `get_text(separator=" ")`), never at feed-chunk boundaries.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.size = 0
+        self._run: list[str] = []
+        self._skip = 0
+
+    def _flush(self):
+        if self._run:
+            piece = " ".join("".join(self._run).split())
+            self._run = []
+            if piece:
+                self.parts.append(piece)
+                self.size += len(piece) + 1
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in SKIP_TAGS:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._run.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    @property
+    def collected(self) -> int:
+        return self.size + sum(len(r) for r in self._run)
+
+
+class _AnchorParser(HTMLParser):
+    """Collects (href, text) for <a href> elements and ignores everything else."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors: list[tuple[str, str]] = []
+        self._href: str | None = None
+        self._text: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._href = dict(attrs).get("href")
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href is not None:
+            self.anchors.append((self._href, "".join(self._text).strip()))
+            self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+
+def decode_chunks(chunks: Iterable[bytes], headers: dict | None = None) -> Iterator[str]:
+    """Incrementally decode byte chunks using the Content-Type charset (requests' defaults otherwise)."""
+    enc = get_encoding_from_headers(headers or {}) or "utf-8"
+    try:
+        decoder = codecs.getincrementaldecoder(enc)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for block in chunks:
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def extract_text(chunks: Iterable[str], max_len: int | None = None) -> str:
+    """Whitespace-collapsed visible text; stops consuming `chunks` once `max_len` chars are collected."""
+    p = _TextParser()
+    for text in chunks:
+        p.feed(text)
+        if max_len is not None and p.collected >= max_len:
+            break
+    p.close()
+    out = " ".join(p.parts)
+    return out if max_len is None else out[:max_len]
+
+
+def iter_anchors(chunks: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """Yield (href, text) pairs as soon as each <a> closes; the caller may stop at any point."""
+    p = _AnchorParser()
+    for text in chunks:
+        p.feed(text)
+        yield from p.anchors
+        p.anchors.clear()
+    p.close()
+    yield from p.anchors
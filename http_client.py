@@ -0,0 +1,371 @@
+import hashlib, json, os, re, threading, time
+from typing import Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+
+from instrumentation import record
+
+CACHE_DIR = os.getenv("RISK_HTTP_CACHE", os.path.join(os.path.expanduser("~"), ".ai_risk_report", "http"))
+
+# Requests per second per host; SEC fair-access policy caps automated tools at 10 req/s.
+HOST_RATES = {
+    "www.sec.gov": 10.0,
+    "data.sec.gov": 10.0,
+    "efts.sec.gov": 10.0,
+}
+DEFAULT_RATE = 20.0
+
+
+class RateLimiter:
+    """Token bucket: `rate` tokens per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Block until `n` tokens are available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                # a request larger than the bucket proceeds once the bucket is full
+                if self._tokens >= min(n, self.burst):
+                    self._tokens -= n
+                    return waited
+                delay = (min(n, self.burst) - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CachedResponse:
+    """The parts of `requests.Response` the fetchers use, backed by memory or the disk cache."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: dict, from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.from_cache = from_cache
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        enc = get_encoding_from_headers(self.headers) or "utf-8"
+        return self.content.decode(enc, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} for url: {self.url}")
+
+
+class StreamBody:
+    """Byte-chunk iterator returned by `HttpClient.stream`.
+
+    `close()` releases the connection even if iteration never started (closing
+    an unstarted generator skips its `finally`, which would leak the pooled
+    connection).
+    """
+
+    def __init__(self, chunks: Iterator[bytes], on_close=None):
+        self._chunks = chunks
+        self._on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+
+class HttpClient:
+    """Shared keep-alive session with per-host rate limits, retries and a conditional-GET disk cache.
+
+    Fresh entries (younger than their TTL) are served without touching the
+    network. Stale entries are revalidated with If-None-Match/If-Modified-Since;
+    a 304 refreshes the entry and the cached body is returned. Bodies on disk
+    are kept under `max_bytes`: least recently used entries are pruned when
+    the client starts and whenever a store goes over the budget.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, default_ttl: float = 600, pool_size: int = 16,
+                 retries: int = 3, backoff: float = 0.5, host_rates: dict | None = None,
+                 max_bytes: int = 256 * 2**20):
+        self.cache_dir = cache_dir
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates)
+        self._limiters: dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "revalidated": 0, "misses": 0,
+                      "bytes_fetched": 0, "bytes_saved": 0, "evicted": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = 0
+        self.prune()
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET", "HEAD"), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # -- helpers ------------------------------------------------------------
+    def _limiter(self, url: str) -> RateLimiter:
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = RateLimiter(self.host_rates.get(host, DEFAULT_RATE))
+            return self._limiters[host]
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                self.stats[k] += v
+
+    def _paths(self, url: str, headers: dict | None) -> tuple[str, str]:
+        # Vary on headers that change the representation (UA matters for SEC)
+        key = url + "\n" + json.dumps(sorted((headers or {}).items()))
+        h = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, h + ".json"), os.path.join(self.cache_dir, h + ".body")
+
+    @staticmethod
+    def _max_age(headers) -> float | None:
+        cc = headers.get("Cache-Control", "")
+        if "no-store" in cc:
+            return 0.0
+        m = re.search(r"max-age=(\d+)", cc)
+        return float(m.group(1)) if m else None
+
+    def _load(self, meta_path: str, body_path: str, with_body: bool = True) -> tuple[dict, bytes | None] | None:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if not with_body:
+                return (meta, None) if os.path.exists(body_path) else None
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, meta_path: str, body_path: str, meta: dict, body: bytes | None) -> None:
+        tmp = f".{os.getpid()}.{threading.get_ident()}.tmp"  # concurrent writers never share a temp file
+        if body is not None:
+            with open(body_path + tmp, "wb") as f:
+                f.write(body)
+            os.replace(body_path + tmp, body_path)
+        with open(meta_path + tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp, meta_path)
+        if body is not None:
+            with self._lock:
+                self._size += len(body)
+                over = self._size > self.max_bytes
+            if over:
+                self.prune()
+
+    @staticmethod
+    def _touch(body_path: str) -> None:
+        """Mark an entry as used (its body's mtime orders the LRU pruning)."""
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+
+    def prune(self, target: float = 0.8) -> int:
+        """Delete least recently used entries until the bodies fit in `target` x `max_bytes`; returns the count."""
+        entries = []
+        for e in os.scandir(self.cache_dir):
+            if e.name.endswith(".body"):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, body_path in sorted(entries):
+                if total <= target * self.max_bytes:
+                    break
+                for path in (body_path[:-5] + ".json", body_path):  # meta first: no entry without a body
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+        with self._lock:
+            self._size = total
+            self.stats["evicted"] += removed
+        return removed
+
+    @staticmethod
+    def _conditional(headers: dict | None, meta: dict | None) -> dict:
+        req_headers = dict(headers or {})
+        if meta:
+            if meta["headers"].get("ETag"):
+                req_headers["If-None-Match"] = meta["headers"]["ETag"]
+            if meta["headers"].get("Last-Modified"):
+                req_headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+        return req_headers
+
+    def _policy(self, r: requests.Response, ttl: float | None) -> tuple[dict, float, bool]:
+        """(headers worth keeping, effective TTL, whether the response may be stored)."""
+        keep = {k: r.headers[k] for k in ("Content-Type", "ETag", "Last-Modified", "Cache-Control") if k in r.headers}
+        eff_ttl = ttl if ttl is not None else self._max_age(r.headers)
+        eff_ttl = self.default_ttl if eff_ttl is None else eff_ttl
+        no_store = "no-store" in r.headers.get("Cache-Control", "")
+        storable = r.status_code == 200 and not no_store and (eff_ttl > 0 or "ETag" in keep or "Last-Modified" in keep)
+        return keep, eff_ttl, storable
+
+    # -- public API ---------------------------------------------------------
+    def get(self, url: str, headers: dict | None = None, timeout: float = 12, ttl: float | None = None) -> CachedResponse:
+        """GET through the cache. `ttl` overrides the server's max-age / the client default."""
+        self._count(requests=1)
+        meta_path, body_path = self._paths(url, headers)
+        cached = self._load(meta_path, body_path)
+        now = time.time()
+        if cached:
+            meta, body = cached
+            if now - meta["fetched_at"] < meta["ttl"]:
+                self._touch(body_path)
+                self._count(hits=1, bytes_saved=len(body))
+                record(cached_bytes=len(body))
+                return CachedResponse(url, meta["status"], body, meta["headers"], from_cache=True)
+
+        self._limiter(url).acquire()
+        r = self.session.get(url, headers=self._conditional(headers, cached and cached[0]), timeout=timeout)
+
+        if r.status_code == 304 and cached:
+            meta, body = cached
+            meta["fetched_at"] = now
+            self._store(meta_path, body_path, meta, None)
+            self._touch(body_path)
+            self._count(revalidated=1, bytes_saved=len(body))
+            record(cached_bytes=len(body))
+            return CachedResponse(url, meta["status"], body, meta["headers"], from_cache=True)
+
+        body = r.content
+        self._count(misses=1, bytes_fetched=len(body))
+        record(bytes=len(body))
+        keep, eff_ttl, storable = self._policy(r, ttl)
+        if storable:
+            self._store(meta_path, body_path,
+                        {"status": r.status_code, "headers": keep, "fetched_at": now, "ttl": eff_ttl}, body)
+        return CachedResponse(url, r.status_code, body, keep)
+
+    def stream(self, url: str, headers: dict | None = None, timeout: float = 15, ttl: float | None = None,
+               chunk_size: int = 64 * 1024, cache_max_bytes: int = 8 * 2**20) -> tuple[int, dict, StreamBody]:
+        """Incremental GET: returns (status, headers, StreamBody) without buffering the body.
+
+        Fresh or 304-revalidated cache entries are replayed from disk in chunks.
+        A network body is written to the cache only if the caller reads it to the
+        end and it is at most `cache_max_bytes`; stopping early (e.g. once enough
+        text is extracted) closes the connection and stores nothing. A non-2xx
+        response is closed here and comes back with an empty body. Callers
+        should `close()` the body when done (reading it to the end also does).
+        """
+        self._count(requests=1)
+        meta_path, body_path = self._paths(url, headers)
+        cached = self._load(meta_path, body_path, with_body=False)
+        now = time.time()
+
+        def replay(meta: dict, counter: str) -> tuple[int, dict, StreamBody]:
+            size = os.path.getsize(body_path)
+            self._touch(body_path)
+            self._count(**{counter: 1, "bytes_saved": size})
+            record(cached_bytes=size)
+
+            def chunks():
+                with open(body_path, "rb") as f:
+                    while block := f.read(chunk_size):
+                        yield block
+            return meta["status"], meta["headers"], StreamBody(chunks())
+
+        if cached and now - cached[0]["fetched_at"] < cached[0]["ttl"]:
+            return replay(cached[0], "hits")
+
+        self._limiter(url).acquire()
+        r = self.session.get(url, headers=self._conditional(headers, cached and cached[0]),
+                             timeout=timeout, stream=True)
+        if r.status_code == 304 and cached:
+            r.close()
+            meta = cached[0]
+            meta["fetched_at"] = now
+            self._store(meta_path, body_path, meta, None)
+            return replay(meta, "revalidated")
+
+        self._count(misses=1)
+        keep, eff_ttl, storable = self._policy(r, ttl)
+        if not 200 <= r.status_code < 300:
+            r.close()
+            return r.status_code, keep, StreamBody(iter(()))
+
+        def chunks():
+            buf, size = [], 0
+            try:
+                for block in r.iter_content(chunk_size=chunk_size):
+                    size += len(block)
+                    self._count(bytes_fetched=len(block))
+                    record(bytes=len(block))
+                    if storable and size <= cache_max_bytes:
+                        buf.append(block)
+                    elif buf:
+                        buf = []  # too big to cache: stop holding it
+                    yield block
+                if storable and size <= cache_max_bytes:
+                    self._store(meta_path, body_path,
+                                {"status": r.status_code, "headers": keep, "fetched_at": now, "ttl": eff_ttl},
+                                b"".join(buf))
+            finally:
+                r.close()
+        return r.status_code, keep, StreamBody(chunks(), r.close)
+
+    def cache_summary(self) -> dict:
+        """Counters plus hit rate (fresh hits and 304s over all requests)."""
+        with self._lock:
+            s = dict(self.stats)
+        served = s["hits"] + s["revalidated"]
+        s["hit_rate"] = served / s["requests"] if s["requests"] else 0.0
+        return s
+
+
+_default_client: HttpClient | None = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def http_get(url: str, headers: dict | None = None, timeout: float = 12, ttl: float | None = None) -> CachedResponse:
+    return get_client().get(url, headers=headers, timeout=timeout, ttl=ttl)
@@ -0,0 +1,175 @@
+import contextvars, functools, itertools, json, threading, time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Callable
+
+import pandas as pd
+
+
+@dataclass
+class Span:
+    name: str
+    id: int
+    parent: int | None
+    start: float  # seconds since the trace began
+    seconds: float = 0.0
+    bytes: int = 0  # fetched over the network
+    rows: int = 0  # processed (price rows, items, tickers, blocks ... whatever the stage works through)
+    status: str = "ok"
+    thread: str = ""
+    attrs: dict = field(default_factory=dict)
+
+
+class Trace:
+    """Spans of one run. Recording is thread-safe; spans nest through context variables.
+
+    Work handed to a thread pool nests under the submitting span when the
+    callable is wrapped with `bind` (SourceRunner does this for every source).
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _open(self, name: str, parent: Span | None, attrs: dict) -> Span:
+        with self._lock:
+            s = Span(name, next(self._ids), parent.id if parent else None, time.perf_counter() - self.t0,
+                     thread=threading.current_thread().name, attrs=dict(attrs))
+            self.spans.append(s)
+        return s
+
+    def add(self, s: Span, bytes: int = 0, rows: int = 0, **counters) -> None:
+        with self._lock:
+            s.bytes += int(bytes)
+            s.rows += int(rows)
+            for k, v in counters.items():
+                s.attrs[k] = s.attrs.get(k, 0) + v if isinstance(v, (int, float)) else v
+
+    def to_records(self) -> list[dict]:
+        with self._lock:
+            return [asdict(s) for s in self.spans]
+
+    def to_json(self, indent: int | None = 2) -> str:
+        return json.dumps({"spans": self.to_records()}, indent=indent, default=str)
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+    def frame(self) -> pd.DataFrame:
+        """Spans in start order, names prefixed with one dot per nesting level."""
+        recs = sorted(self.to_records(), key=lambda r: r["start"])
+        depth, rows = {}, []
+        for r in recs:
+            d = depth[r["id"]] = depth.get(r["parent"], -1) + 1
+            rows.append({"Span": "· " * d + r["name"], "Start": round(r["start"], 3),
+                         "Seconds": round(r["seconds"], 3), "Bytes": r["bytes"], "Rows": r["rows"],
+                         "Status": r["status"], "Thread": r["thread"]})
+        return pd.DataFrame(rows, columns=["Span", "Start", "Seconds", "Bytes", "Rows", "Status", "Thread"])
+
+    def summary(self) -> pd.DataFrame:
+        """Calls, total wall time, bytes and rows per span name, slowest first."""
+        df = pd.DataFrame(self.to_records(), columns=["name", "seconds", "bytes", "rows"])
+        out = df.groupby("name").agg(Calls=("seconds", "size"), Seconds=("seconds", "sum"),
+                                     Bytes=("bytes", "sum"), Rows=("rows", "sum"))
+        out.index.name = "Span"
+        return out.round({"Seconds": 3}).sort_values("Seconds", ascending=False)
+
+
+class _NoSpan:
+    def add(self, *args, **kwargs) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+class _Handle:
+    """What `span()` yields: `add(bytes=, rows=, **counters)` on the open span."""
+
+    __slots__ = ("trace", "span")
+
+    def __init__(self, trace: Trace, span: Span):
+        self.trace, self.span = trace, span
+
+    def add(self, bytes: int = 0, rows: int = 0, **counters) -> None:
+        self.trace.add(self.span, bytes, rows, **counters)
+
+
+def start(trace: Trace | None = None) -> Trace:
+    """Record spans into `trace` (a new one by default) for the rest of the current context."""
+    trace = trace or Trace()
+    _trace.set(trace)
+    _span.set(None)
+    return trace
+
+
+@contextmanager
+def tracing(trace: Trace | None = None):
+    """Record spans into a trace inside the block; yields the trace."""
+    trace = trace or Trace()
+    t_tok, s_tok = _trace.set(trace), _span.set(None)
+    try:
+        yield trace
+    finally:
+        _trace.reset(t_tok)
+        _span.reset(s_tok)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span. A no-op when no trace is active."""
+    trace = _trace.get()
+    if trace is None:
+        yield _NO_SPAN
+        return
+    s = trace._open(name, _span.get(), attrs)
+    tok = _span.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield _Handle(trace, s)
+    except BaseException as e:
+        s.status = "error"
+        s.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.seconds = time.perf_counter() - t0
+        _span.reset(tok)
+
+
+def record(bytes: int = 0, rows: int = 0, **counters) -> None:
+    """Add bytes/rows/counters to the innermost open span, if any."""
+    trace, s = _trace.get(), _span.get()
+    if trace is not None and s is not None:
+        trace.add(s, bytes, rows, **counters)
+
+
+def traced(name: str | None = None) -> Callable:
+    """Decorator: run the function inside `span(name)` (default: module.function)."""
+    def wrap(fn):
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def bind(fn: Callable) -> Callable:
+    """`fn` running in (a copy of) the caller's context, so spans from pool threads nest under the caller's."""
+    ctx = contextvars.copy_context()
+    if ctx.get(_trace) is None:
+        return fn
+    return functools.partial(_run_in, ctx, fn)
+
+
+def _run_in(ctx: contextvars.Context, fn: Callable, *args, **kwargs):
+    return ctx.copy().run(fn, *args, **kwargs)
@@ -0,0 +1,196 @@
+import math, os, time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Per-process simulation spec, installed once by the pool initializer so large
+# inputs (Cholesky factor, residual panel) are not re-pickled for every chunk.
+# Only pool workers read it: in-process runs pass their spec explicitly, since
+# Streamlit sessions are threads of one process and would overwrite each other's.
+_SPEC: dict | None = None
+# Below this many simulated draws (paths x assets, ~0.5s in one process) a pool costs more than it saves
+PARALLEL_MIN_DRAWS = 20_000_000
+# FHS residuals dropped while the EWMA variance is still close to its seed
+FHS_BURN_IN = 20
+
+
+def _init_worker(spec: dict) -> None:
+    global _SPEC
+    _SPEC = spec
+
+
+def _factor(cov: np.ndarray) -> np.ndarray:
+    """Cholesky factor, falling back to a clipped eigen-factor for non-PSD pairwise covariances."""
+    cov = np.nan_to_num(np.asarray(cov, dtype=float))
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(cov)
+        return vecs * np.sqrt(np.clip(vals, 0.0, None))
+
+
+def _simulate_chunk(seed: np.random.SeedSequence, n: int, keep: int, spec: dict | None = None) -> np.ndarray:
+    """Simulate `n` one-day portfolio losses and return the largest `keep` of them (`spec` defaults to the worker's)."""
+    spec = _SPEC if spec is None else spec
+    rng = np.random.default_rng(seed)
+    if spec["kind"] == "fhs":
+        rows = rng.integers(0, len(spec["resid"]), size=n)
+        port = (spec["resid"][rows] * spec["sigma"]) @ spec["weights"]
+    else:
+        z = rng.standard_normal((n, spec["b"].shape[0]))
+        port = z @ spec["b"]
+        if spec["kind"] == "t":
+            dof = spec["df"]
+            # scale so the simulated covariance matches `cov` rather than cov * df / (df - 2)
+            port *= np.sqrt((dof - 2.0) / rng.chisquare(dof, size=n))
+        port += spec["mu_p"]
+    losses = -port
+    if keep < n:
+        losses = np.partition(losses, n - keep)[n - keep:]
+    return losses
+
+
+def _tail_table(tail: np.ndarray, n_paths: int, alphas) -> pd.DataFrame:
+    """VaR/ES from the merged top-tail losses (sorted descending)."""
+    out = {}
+    for a in alphas:
+        k = max(1, math.ceil(n_paths * (1.0 - a)))
+        out[f"VaR@{int(a*100)}"] = tail[k - 1]
+        out[f"ES@{int(a*100)}"] = tail[:k].mean()
+    return pd.DataFrame(out, index=["Portfolio"]).T
+
+
+def _run(spec: dict, n_assets: int, alphas, n_paths: int, chunk_size: int | None,
+         seed: int | None, n_workers: int, max_chunk_bytes: int) -> tuple[pd.DataFrame, dict]:
+    """Chunked simulation with a bounded running tail buffer.
+
+    Every chunk gets its own child SeedSequence, so the result depends only on
+    `seed` and `chunk_size`, never on how chunks are spread across processes.
+    Small simulations run in-process whatever `n_workers` says.
+    """
+    t0 = time.perf_counter()
+    if chunk_size is None:
+        chunk_size = max(1_000, max_chunk_bytes // (8 * max(n_assets, 1)))
+    chunk_size = min(chunk_size, n_paths)
+    sizes = [chunk_size] * (n_paths // chunk_size)
+    if n_paths % chunk_size:
+        sizes.append(n_paths % chunk_size)
+    keep = max(1, math.ceil(n_paths * (1.0 - min(alphas))))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if n_paths * max(n_assets, 1) < PARALLEL_MIN_DRAWS:
+        n_workers = 1
+    tail = np.empty(0)
+
+    def merge(tail: np.ndarray, part: np.ndarray) -> np.ndarray:
+        both = np.concatenate([tail, part])
+        if len(both) > keep:
+            both = np.partition(both, len(both) - keep)[len(both) - keep:]
+        return both
+
+    if n_workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(spec,)) as pool:
+            for part in pool.map(_simulate_chunk, seeds, sizes, [min(keep, s) for s in sizes]):
+                tail = merge(tail, part)
+    else:
+        for s, n in zip(seeds, sizes):
+            tail = merge(tail, _simulate_chunk(s, n, min(keep, n), spec))
+
+    tail = np.sort(tail)[::-1]
+    runtime = time.perf_counter() - t0
+    stats = {
+        "method": spec["kind"],
+        "paths": n_paths,
+        "chunks": len(sizes),
+        "chunk_size": chunk_size,
+        "workers": n_workers,
+        "runtime_s": round(runtime, 3),
+        "paths_per_sec": int(n_paths / runtime) if runtime > 0 else None,
+    }
+    return _tail_table(tail, n_paths, alphas), stats
+
+
+def _weights(index, weights: pd.Series | None) -> np.ndarray:
+    if weights is None:
+        return np.full(len(index), 1.0 / len(index))
+    return weights.reindex(index).fillna(0.0).to_numpy(dtype=float)
+
+
+def parametric_var_es(mu: pd.Series, cov: pd.DataFrame, weights: pd.Series | None = None,
+                      alphas=(0.95, 0.99)) -> pd.DataFrame:
+    """Closed-form delta-normal VaR/ES on daily returns; outputs positive loss numbers."""
+    w = _weights(cov.columns, weights)
+    mu_p = float(np.nan_to_num(mu.reindex(cov.columns).to_numpy(dtype=float)) @ w)
+    sigma_p = math.sqrt(max(float(w @ np.nan_to_num(cov.to_numpy(dtype=float)) @ w), 0.0))
+    nd = NormalDist()
+    out = {}
+    for a in alphas:
+        z = nd.inv_cdf(a)
+        out[f"VaR@{int(a*100)}"] = -mu_p + sigma_p * z
+        out[f"ES@{int(a*100)}"] = -mu_p + sigma_p * nd.pdf(z) / (1.0 - a)
+    return pd.DataFrame(out, index=["Portfolio"]).T
+
+
+def mc_var_es(mu: pd.Series, cov: pd.DataFrame, weights: pd.Series | None = None, alphas=(0.95, 0.99),
+              n_paths: int = 100_000, dist: str = "normal", df: float = 5.0, chunk_size: int | None = None,
+              seed: int | None = None, n_workers: int = 1,
+              max_chunk_bytes: int = 64 * 2**20) -> tuple[pd.DataFrame, dict]:
+    """Monte Carlo VaR/ES under a multivariate normal or Student-t with covariance `cov`.
+
+    Returns (VaR/ES table shaped like `utils.var_es`, run stats incl. paths/sec).
+    """
+    if dist not in ("normal", "t"):
+        raise ValueError(f"Unknown dist: {dist}")
+    w = _weights(cov.columns, weights)
+    spec = {
+        "kind": dist,
+        # w' (mu + L z) = w'mu + (L' w)' z: only the projected factor is needed per path
+        "b": _factor(cov.to_numpy(dtype=float)).T @ w,
+        "mu_p": float(np.nan_to_num(mu.reindex(cov.columns).to_numpy(dtype=float)) @ w),
+        "df": float(df),
+    }
+    return _run(spec, len(w), alphas, n_paths, chunk_size, seed, n_workers, max_chunk_bytes)
+
+
+def ewma_vol(rets: pd.DataFrame, lam: float = 0.94) -> pd.DataFrame:
+    """RiskMetrics EWMA volatility; row t is the forecast for t+1 made with data through t.
+
+    The recursion is seeded with each column's sample variance rather than the
+    first squared return, so a near-zero first return does not blow up the
+    early standardised residuals.
+    """
+    seed = rets.var().to_frame().T
+    var = pd.concat([seed, rets ** 2]).ewm(alpha=1.0 - lam, adjust=False).mean().iloc[1:]
+    return np.sqrt(var)
+
+
+def fhs_var_es(rets: pd.DataFrame, weights: pd.Series | None = None, alphas=(0.95, 0.99),
+               n_paths: int = 100_000, lam: float = 0.94, chunk_size: int | None = None,
+               seed: int | None = None, n_workers: int = 1,
+               max_chunk_bytes: int = 64 * 2**20) -> tuple[pd.DataFrame, dict]:
+    """Filtered historical simulation: bootstrap EWMA-standardised return rows, rescale by today's vol.
+
+    Whole dates are resampled so cross-sectional dependence is kept; only dates
+    where every ticker has a return are used, and the first `FHS_BURN_IN`
+    residuals (while the EWMA is still settling) are left out.
+    """
+    rets = rets.dropna()
+    if len(rets) < 2:
+        raise ValueError("Need at least two complete return rows for FHS.")
+    sigma = ewma_vol(rets, lam)
+    # standardise each return by the vol forecast made the day before
+    resid = (rets / sigma.shift(1)).iloc[1:].replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    resid = resid.iloc[min(FHS_BURN_IN, len(resid) - 1):]
+    spec = {
+        "kind": "fhs",
+        "resid": resid.to_numpy(dtype=float),
+        "sigma": sigma.iloc[-1].to_numpy(dtype=float),
+        "weights": _weights(rets.columns, weights),
+    }
+    return _run(spec, rets.shape[1], alphas, n_paths, chunk_size, seed, n_workers, max_chunk_bytes)
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) - 1)
@@ -0,0 +1,112 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+import pandas as pd
+
+from instrumentation import span, bind
+
+
+@dataclass
+class SourceResult:
+    name: str
+    value: Any = None
+    error: BaseException | None = None
+    status: str = "ok"  # ok | error | timeout
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+class SourceRunner:
+    """Run independent data sources on a bounded thread pool and yield them as they finish.
+
+    Each source has its own timeout, measured from submission. A source that
+    misses it is reported as `timeout` and cancelled if it has not started yet;
+    one already blocked in a network call cannot be interrupted, so it is left
+    to finish in the background and its result is discarded. Sources may be
+    submitted while iterating (e.g. summaries once the filings list arrives).
+    Values already known (e.g. from the stage cache) go through `complete` and
+    are yielded alongside the live ones.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="source")
+        self._pending: dict[Future, tuple[str, float, float]] = {}
+        self._ready: list[SourceResult] = []
+        self._runtime: dict[str, list[float]] = {}
+        self.results: dict[str, SourceResult] = {}
+        self.started = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, name: str, fn: Callable, *args, timeout: float = 30.0, **kwargs) -> None:
+        def timed():
+            t0 = time.perf_counter()
+            try:
+                with span(f"source.{name}"):
+                    return fn(*args, **kwargs)
+            finally:
+                self._runtime[name] = [t0, time.perf_counter()]
+
+        now = time.perf_counter()
+        self._pending[self._pool.submit(bind(timed))] = (name, now, now + timeout)
+
+    def complete(self, name: str, value: Any) -> None:
+        """Report `name` as finished with `value` without running anything."""
+        self._ready.append(SourceResult(name, value, cached=True))
+
+    def as_completed(self) -> Iterator[SourceResult]:
+        while self._pending or self._ready:
+            while self._ready:
+                res = self._ready.pop(0)
+                self.results[res.name] = res
+                yield res
+            if not self._pending:
+                continue
+            deadline = min(d for _, _, d in self._pending.values())
+            done, _ = wait(list(self._pending), timeout=max(0.0, deadline - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            for fut in list(self._pending):
+                name, submitted, due = self._pending[fut]
+                if fut in done:
+                    del self._pending[fut]
+                    t0, t1 = self._runtime.get(name, (submitted, now))
+                    err = fut.exception()
+                    res = SourceResult(name, None if err else fut.result(), err,
+                                       "error" if err else "ok", t1 - t0)
+                elif now >= due:
+                    del self._pending[fut]
+                    fut.cancel()
+                    res = SourceResult(name, None, TimeoutError(f"{name} timed out after {due - submitted:.0f}s"),
+                                       "timeout", now - submitted)
+                else:
+                    continue
+                self.results[name] = res
+                yield res
+
+    def shutdown(self) -> None:
+        for fut in self._pending:
+            fut.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def timings(self) -> pd.DataFrame:
+        """Per-source status and wall time, slowest first."""
+        rows = [{"Source": r.name, "Status": "cached" if r.cached else r.status, "Seconds": round(r.elapsed, 3)}
+                for r in self.results.values()]
+        df = pd.DataFrame(rows, columns=["Source", "Status", "Seconds"])
+        return df.sort_values("Seconds", ascending=False).set_index("Source")
+
+    @property
+    def wall_time(self) -> float:
+        return time.perf_counter() - self.started
@@ -1,31 +1,453 @@
+import os, re, zlib
+from io import BytesIO
+from typing import Iterator, NamedTuple
+
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from instrumentation import span
+
+class Style(NamedTuple):
+    font: str
+    size: float
+    leading: float
+    space_before: float = 0.0
+    space_after: float = 0.0
+
+# Built once and shared by every render
+STYLES = {
+    "h1": Style("Helvetica-Bold", 18, 22, 4, 8),
+    "h2": Style("Helvetica-Bold", 14, 18, 10, 6),
+    "h3": Style("Helvetica-Bold", 11.5, 15, 8, 4),
+    "para": Style("Helvetica", 9.5, 12.5, 0, 5),
+    "bold": Style("Helvetica-Bold", 9.5, 12.5, 2, 5),
+    "bullet": Style("Helvetica", 9.5, 12.5, 0, 2),
+    "code": Style("Courier", 8, 10, 2, 6),
+    "cell": Style("Helvetica", 8, 10.5),
+    "head": Style("Helvetica-Bold", 8, 10.5),
+    "footer": Style("Helvetica", 7.5, 9),
+}
+CELL_PAD = 3.0
+MIN_TABLE_FONT = 6.5
+
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)")
+_HEADING = re.compile(r"(#{1,6})\s+(.*)")
+_BULLET = re.compile(r"\s*[-*+]\s+(.*)")
+_RULE = re.compile(r":?-{2,}:?")
+
+def _inline(text: str) -> str:
+    """Plain text for a Markdown run: links keep their label, emphasis markers go."""
+    return _LINK.sub(r"\1", text).replace("**", "").replace("`", "")
+
+def _cells(line: str) -> list[str]:
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+def _table(lines: list[str]) -> tuple:
+    rows = [_cells(ln) for ln in lines]
+    if len(rows) > 1 and all(_RULE.fullmatch(c) for c in rows[1] if c):
+        header, rule, body = rows[0], rows[1], rows[2:]
+        aligns = ["right" if c.endswith(":") and not c.startswith(":") else
+                  "center" if c.startswith(":") and c.endswith(":") else "left" for c in rule]
+    else:
+        header, body, aligns = rows[0], rows[1:], ["left"] * len(rows[0])
+    n = len(header)
+    aligns = (aligns + ["left"] * n)[:n]
+    body = [(r + [""] * n)[:n] for r in body]
+    return [_inline(c) for c in header], aligns, [[_inline(c) for c in r] for r in body]
+
+def _lines(text: str) -> Iterator[str]:
+    """`text.splitlines()` without building the whole list up front."""
+    pos, n = 0, len(text)
+    while pos < n:
+        end = text.find("\n", pos)
+        end = n if end < 0 else end
+        yield text[pos:end].rstrip("\r")
+        pos = end + 1
+
+def parse_blocks(md_text: str) -> Iterator[tuple]:
+    """One pass over the Markdown, yielding (kind, payload) blocks.
+
+    Kinds: h1/h2/h3, para, bold, bullet (text payload), code (list of lines)
+    and table ((header, aligns, rows)).
+    """
+    para, table, code = [], [], None
+
+    def flush():
+        if para:
+            text = " ".join(para)
+            bold = text.startswith("**") and text.endswith("**") and text.count("**") == 2
+            yield ("bold" if bold else "para"), _inline(text)
+            para.clear()
+        if table:
+            yield "table", _table(table)
+            table.clear()
+
+    for line in _lines(md_text):
+        s = line.rstrip()
+        if code is not None:
+            if s.startswith("```"):
+                yield "code", code
+                code = None
+            else:
+                code.append(line.replace("\t", "    "))
+            continue
+        if s.startswith("```"):
+            yield from flush()
+            code = []
+            continue
+        if s.lstrip().startswith("|"):
+            if para:
+                yield "para", _inline(" ".join(para))
+                para.clear()
+            table.append(s)
+            continue
+        if table or not s.strip():
+            yield from flush()
+            if not s.strip():
+                continue
+        m = _HEADING.match(s)
+        if m:
+            yield from flush()
+            yield f"h{min(len(m.group(1)), 3)}", _inline(m.group(2))
+            continue
+        m = _BULLET.match(s)
+        if m:
+            yield from flush()
+            yield "bullet", _inline(m.group(1))
+            continue
+        para.append(s.strip())
+    if code is not None:
+        yield "code", code
+    yield from flush()
+
+class _Widths(dict):
+    """Glyph widths of one font in 1/1000 em, looked up once per character."""
+
+    def __init__(self, font: str):
+        super().__init__()
+        self.font = font
+
+    def __missing__(self, ch: str) -> float:
+        w = self[ch] = stringWidth(ch, self.font, 1000)
+        return w
+
+_WIDTHS: dict[str, _Widths] = {}
+
+def _width(text: str, font: str, size: float) -> float:
+    """`stringWidth` for the standard Type 1 fonts (no kerning), from a per-font character table."""
+    table = _WIDTHS.get(font) or _WIDTHS.setdefault(font, _Widths(font))
+    return sum(map(table.__getitem__, text)) * size / 1000
+
+def _fit(text: str, font: str, size: float, width: float) -> str:
+    """Truncate `text` with an ellipsis so it fits `width`."""
+    if _width(text, font, size) <= width + 0.01:  # widths come back from sums of these
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _width(text[:mid] + "…", font, size) <= width:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "…"
+
+def _num(x: float) -> bytes:
+    return (b"%.2f" % x).rstrip(b"0").rstrip(b".") or b"0"
+
+def _pdf_string(text: str) -> bytes:
+    """PDF literal string in WinAnsi, the encoding of the standard fonts."""
+    raw = text.encode("cp1252", "replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"\\r") + b")"
+
+class PdfWriter:
+    """Minimal PDF writer that sends every page to the sink as soon as it is closed.
+
+    reportlab's canvas keeps all page streams until `save()`, so its memory
+    grows with the page count. The report only needs the standard Type 1
+    fonts, text, filled rectangles, lines and gray levels, so pages are
+    written here directly: what stays in memory is the open page's operators
+    and one file offset per object.
+    """
+
+    FONTS = ("Helvetica", "Helvetica-Bold", "Courier")
+
+    def __init__(self, sink, pagesize=A4, compress: bool = True):
+        self._own = isinstance(sink, (str, os.PathLike))
+        self.f = open(sink, "wb") if self._own else sink
+        self.width, self.height = pagesize
+        self.compress = compress
+        self.pages = 0
+        try:
+            self._pos = self.f.tell()  # xref offsets count from the start of the file, whatever precedes us
+        except (AttributeError, OSError, ValueError):
+            self._pos = 0  # unseekable stream: the reader sees it from our first byte
+        self._offsets: dict[int, int] = {}
+        self._kids: list[int] = []
+        self._next_id = 3 + len(self.FONTS)  # 1 catalog, 2 page tree, then the fonts
+        self._ops: list[bytes] = []
+        self._font = None
+        self._fonts = {name: b"/F%d" % (i + 1) for i, name in enumerate(self.FONTS)}
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for i, name in enumerate(self.FONTS):
+            self._obj(3 + i, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                      % name.encode("ascii"))
+        fonts = b" ".join(b"/F%d %d 0 R" % (i + 1, 3 + i) for i in range(len(self.FONTS)))
+        self._page_dict = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] /Resources << /Font << %s >> >>"
+                           % (_num(self.width), _num(self.height), fonts))
+
+    def _write(self, data: bytes) -> None:
+        self.f.write(data)
+        self._pos += len(data)
+
+    def _obj(self, num: int, body: bytes) -> None:
+        self._offsets[num] = self._pos
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+
+    # -- drawing (PDF user space: origin bottom left) -----------------------
+    def set_font(self, name: str, size: float) -> None:
+        if self._font != (name, size):
+            self._ops.append(b"%s %s Tf" % (self._fonts[name], _num(size)))
+            self._font = (name, size)
+
+    def fill_gray(self, g: float) -> None:
+        self._ops.append(b"%s g" % _num(g))
+
+    def line_width(self, w: float) -> None:
+        self._ops.append(b"%s w" % _num(w))
+
+    def text(self, x: float, y: float, text: str) -> None:
+        self._ops.append(b"BT %s %s Td %s Tj ET" % (_num(x), _num(y), _pdf_string(text)))
+
+    def text_runs(self, y: float, runs: list[tuple[float, str]]) -> None:
+        """Several strings on one baseline in a single text object, placed with relative moves."""
+        parts, pos = [b"BT"], 0.0
+        for x, text in runs:
+            parts.append(b"%s %s Td %s Tj" % (_num(x - pos), _num(y) if pos == 0.0 else b"0", _pdf_string(text)))
+            pos = x
+        parts.append(b"ET")
+        self._ops.append(b" ".join(parts))
+
+    def rect_fill(self, x: float, y: float, w: float, h: float) -> None:
+        self._ops.append(b"%s %s %s %s re f" % (_num(x), _num(y), _num(w), _num(h)))
+
+    def line(self, x1: float, y1: float, x2: float, y2: float) -> None:
+        self._ops.append(b"%s %s m %s %s l S" % (_num(x1), _num(y1), _num(x2), _num(y2)))
+
+    # -- pages ------------------------------------------------------------
+    def show_page(self) -> None:
+        """Write the open page (content stream + page object) and start a fresh one."""
+        data = b"\n".join(self._ops)
+        head = b"<< /Length %d >>"
+        if self.compress:
+            data = zlib.compress(data)
+            head = b"<< /Length %d /Filter /FlateDecode >>"
+        content, page = self._next_id, self._next_id + 1
+        self._next_id += 2
+        self._obj(content, head % len(data) + b"\nstream\n" + data + b"\nendstream")
+        self._obj(page, self._page_dict + b" /Contents %d 0 R >>" % content)
+        self._kids.append(page)
+        self._ops = []
+        self._font = None  # graphics state starts over on every page
+        self.pages += 1
+
+    def close(self) -> None:
+        """Page tree, catalog, cross-reference table and trailer; closes the sink if it was a path."""
+        kids = b" ".join(b"%d 0 R" % k for k in self._kids)
+        self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._kids)))
+        self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref, n = self._pos, self._next_id
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % n)
+        self._write(b"".join(b"%010d 00000 n \n" % self._offsets[i] for i in range(1, n)))
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (n, xref))
+        self.release()
+
+    def release(self) -> None:
+        """Close the file if the writer opened it from a path (also after a failed render)."""
+        if self._own and not self.f.closed:
+            self.f.close()
+
+class PdfRenderer:
+    """Draws parsed report Markdown into a `PdfWriter` on `sink` (path or binary file object).
+
+    Fonts are switched only when the style changes, and each page is written
+    to the sink as soon as it is full, so memory does not grow with the page
+    count.
+    """
+
+    def __init__(self, sink, pagesize=A4, margin: float = 2*cm):
+        self.pdf = PdfWriter(sink, pagesize)
+        self.width, self.height = pagesize
+        self.left, self.right = margin, self.width - margin
+        self.top, self.bottom = self.height - margin, margin
+        self.y = self.top
+        self.pages = 0
+        self._dirty = False
+
+    # -- page handling ----------------------------------------------------
+    def _set_font(self, font: str, size: float) -> None:
+        self.pdf.set_font(font, size)
+
+    def _end_page(self) -> None:
+        self.pages += 1
+        st = STYLES["footer"]
+        self._set_font(st.font, st.size)
+        self.pdf.fill_gray(0.45)
+        label = str(self.pages)
+        self.pdf.text(self.right - _width(label, st.font, st.size), self.bottom - 1.0*cm, label)
+        self.pdf.fill_gray(0)
+        self.pdf.show_page()
+        self.y = self.top
+        self._dirty = False
+
+    def _room(self, h: float) -> bool:
+        """Make room for `h` points; returns True if a new page was started."""
+        if self.y - h < self.bottom and self._dirty:
+            self._end_page()
+            return True
+        return False
+
+    # -- blocks -----------------------------------------------------------
+    def text(self, text: str, st: Style, indent: float = 0.0, bullet: str | None = None) -> None:
+        width = self.right - self.left - indent
+        lines = simpleSplit(text, st.font, st.size, width) or [""]
+        if self.y != self.top:
+            self.y -= st.space_before
+        for i, ln in enumerate(lines):
+            self._room(st.leading)
+            self._set_font(st.font, st.size)
+            self.y -= st.leading
+            if bullet and i == 0:
+                self.pdf.text(self.left + indent - 9, self.y, bullet)
+            self.pdf.text(self.left + indent, self.y, ln)
+            self._dirty = True
+        self.y -= st.space_after
+
+    def code(self, lines: list[str]) -> None:
+        st = STYLES["code"]
+        per_line = max(1, int((self.right - self.left) / _width("M", st.font, st.size)))
+        self.y -= st.space_before
+        for raw in lines or [""]:
+            for i in range(0, max(len(raw), 1), per_line):
+                self._room(st.leading)
+                self._set_font(st.font, st.size)
+                self.y -= st.leading
+                self.pdf.text(self.left, self.y, raw[i:i + per_line])
+                self._dirty = True
+        self.y -= st.space_after
+
+    def table(self, header: list[str], aligns: list[str], rows: list[list[str]]) -> None:
+        """Grid table; shrinks the font to fit, then splits wide tables into column groups (first column repeated)."""
+        cell, head = STYLES["cell"], STYLES["head"]
+        avail = self.right - self.left
+        n = len(header)
+        # Every cell is measured once here; drawing reuses the widths (scaled with the font)
+        head_w = [_width(h, head.font, head.size) for h in header]
+        body_w = [[_width(c, cell.font, cell.size) for c in r] for r in rows]
+        text_w = [min(max([head_w[j]] + [w[j] for w in body_w]), 0.45 * avail) for j in range(n)]
+        size = cell.size
+        if sum(text_w) + 2 * CELL_PAD * n > avail:
+            size = max(MIN_TABLE_FONT, cell.size * (avail - 2 * CELL_PAD * n) / sum(text_w))
+        widths = [w * size / cell.size + 2 * CELL_PAD for w in text_w]
+        groups, cur, used = [], [], 0.0
+        for j in range(n):
+            if cur and used + widths[j] > avail:
+                groups.append(cur)
+                cur, used = ([0], widths[0]) if n > 1 and j > 0 else ([], 0.0)
+            cur.append(j)
+            used += widths[j]
+        groups.append(cur)
+        lead = cell.leading * size / cell.size
+        scale = size / cell.size
+        header_row = (header, [w * scale for w in head_w])
+        body = [(r, [x * scale for x in w]) for r, w in zip(rows, body_w)]
+        for g, cols in enumerate(groups):
+            if g:
+                self.y -= lead / 2
+            self._table_part(header_row, aligns, body, cols, [widths[j] for j in cols], size, lead)
+        self.y -= STYLES["para"].space_after + 2
+
+    def _table_part(self, header, aligns, rows, cols, widths, size, lead) -> None:
+        """One column group; `header` and each row are (values, text widths at `size`)."""
+        cell, head = STYLES["cell"], STYLES["head"]
+        x0 = self.left
+        total = sum(widths)
+
+        def draw_row(row, font, shade):
+            values, text_w = row
+            self.y -= lead
+            if shade:
+                self.pdf.fill_gray(0.94)
+                self.pdf.rect_fill(x0, self.y - 2.5, total, lead)
+                self.pdf.fill_gray(0)
+            self._set_font(font, size)
+            runs, x = [], x0
+            for j, w in zip(cols, widths):
+                txt, tw = values[j], text_w[j]
+                if tw > w - 2 * CELL_PAD + 0.01:
+                    txt = _fit(txt, font, size, w - 2 * CELL_PAD)
+                    tw = _width(txt, font, size)
+                if aligns[j] == "right":
+                    at = x + w - CELL_PAD - tw
+                elif aligns[j] == "center":
+                    at = x + (w - tw) / 2
+                else:
+                    at = x + CELL_PAD
+                runs.append((at, txt))
+                x += w
+            self.pdf.text_runs(self.y, runs)  # one text object per row
+            self._dirty = True
+
+        def draw_header():
+            draw_row(header, head.font, False)
+            self.pdf.line_width(0.6)
+            self.pdf.line(x0, self.y - 3, x0 + total, self.y - 3)
+            self.y -= 2
+
+        self._room(3 * lead)
+        draw_header()
+        for i, r in enumerate(rows):
+            if self._room(lead + 2):
+                draw_header()  # repeat the header on every page the table spans
+            draw_row(r, cell.font, i % 2 == 1)
+        self.pdf.line_width(0.3)
+        self.pdf.line(x0, self.y - 3, x0 + total, self.y - 3)
+
+    def draw(self, kind: str, payload) -> None:
+        if kind == "table":
+            self.table(*payload)
+        elif kind == "code":
+            self.code(payload)
+        elif kind == "bullet":
+            self.text(payload, STYLES["bullet"], indent=12, bullet="•")
+        else:
+            self.text(payload, STYLES[kind])
+
+    def finish(self) -> int:
+        """Close the last page, write the PDF to the sink; returns the page count."""
+        if self._dirty or not self.pages:
+            self._end_page()
+        self.pdf.close()
+        return self.pages
+
+def markdown_to_pdf(md_text: str, sink, pagesize=A4) -> int:
+    """Render report Markdown to `sink` (file path or binary file object); returns the page count."""
+    with span("pdf_export.render") as sp:
+        r = PdfRenderer(sink, pagesize=pagesize)
+        blocks = 0
+        try:
+            for kind, payload in parse_blocks(md_text):
+                r.draw(kind, payload)
+                blocks += 1
+            pages = r.finish()
+        finally:
+            r.pdf.release()
+        sp.add(rows=blocks, pages=pages)
+        return pages
 
 def markdown_to_pdf_bytes(md_text: str) -> bytes:
-    """Minimal markdown-to-PDF: monospaced text with simple wrapping (MVP)."""
-    from io import BytesIO
-    import textwrap
+    """The PDF as bytes (for download buttons); prefer `markdown_to_pdf` with a file for large reports."""
     bio = BytesIO()
-    c = canvas.Canvas(bio, pagesize=A4)
-    width, height = A4
-    left = 2*cm
-    right = width - 2*cm
-    top = height - 2*cm
-    line_height = 12
-    x = left
-    y = top
-
-    for raw_line in md_text.splitlines():
-        line = raw_line.replace("\t", "    ")
-        for wline in textwrap.wrap(line, width=95) or [""]:
-            if y <= 2*cm:
-                c.showPage()
-                y = top
-            c.setFont("Courier", 9)
-            c.drawString(x, y, wline)
-            y -= line_height
-    c.showPage()
-    c.save()
-    bio.seek(0)
-    return bio.read()
+    markdown_to_pdf(md_text, bio)
+    return bio.getvalue()
@@ -0,0 +1,83 @@
+import hashlib, time
+from typing import Any, Callable, MutableMapping
+
+import pandas as pd
+
+from instrumentation import span
+
+
+def fingerprint(obj: Any) -> str:
+    """Stable short hash of a stage input (frames are hashed by content, not identity, also inside containers)."""
+    if isinstance(obj, (tuple, list)):
+        parts = [type(obj).__name__] + [fingerprint(x) for x in obj]
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+    if isinstance(obj, dict):
+        parts = ["dict"] + [f"{fingerprint(k)}={fingerprint(v)}" for k, v in obj.items()]
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        h = pd.util.hash_pandas_object(obj, index=True).values.tobytes()
+        cols = repr(list(obj.columns)) if isinstance(obj, pd.DataFrame) else repr(obj.name)
+        return hashlib.sha1(h + cols.encode("utf-8")).hexdigest()[:16]
+    return hashlib.sha1(repr(obj).encode("utf-8")).hexdigest()[:16]
+
+
+class StageCache:
+    """Memoised report stages that survive Streamlit reruns.
+
+    Entries live in a caller-supplied mapping (the app passes a dict kept in
+    `st.session_state`), keyed by stage name plus a hash of the stage's inputs.
+    Downstream stages key on the fingerprint of an upstream value (or on the
+    upstream key, itself built from fingerprints), so the keys form the
+    dependency graph by content: when an input changes, everything built on it
+    misses, and a refetch that returns the same data reuses it all. Network
+    stages take a `ttl` so a rerun after it expires fetches fresh data.
+    """
+
+    def __init__(self, entries: MutableMapping, max_entries: int = 64):
+        self.entries = entries  # key -> (value, stored_at, expires_at)
+        self.max_entries = max_entries
+        self.log: list[dict] = []
+
+    @staticmethod
+    def key(name: str, *inputs) -> str:
+        parts = "|".join(fingerprint(x) for x in inputs)
+        return f"{name}:{hashlib.sha1(parts.encode('utf-8')).hexdigest()[:16]}"
+
+    def lookup(self, key: str, stale_ok: bool = False) -> tuple[bool, Any]:
+        """(hit, value); `stale_ok` also serves entries past their TTL (redraws that must not refetch)."""
+        entry = self.entries.get(key)
+        if entry is None or (not stale_ok and entry[2] is not None and time.time() >= entry[2]):
+            return False, None
+        self.entries[key] = self.entries.pop(key)  # most recently used last
+        return True, entry[0]
+
+    def put(self, key: str, value: Any, ttl: float | None = None) -> None:
+        now = time.time()
+        self.entries.pop(key, None)
+        self.entries[key] = (value, now, None if ttl is None else now + ttl)
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+
+    def record(self, name: str, cache: str, seconds: float, status: str = "ok") -> None:
+        self.log.append({"Stage": name, "Cache": cache, "Status": status, "Seconds": round(seconds, 3)})
+
+    def run(self, name: str, key: str, fn: Callable, *args, ttl: float | None = None, **kwargs) -> Any:
+        """Return the cached value for `key`, or compute it with `fn(*args, **kwargs)` and store it."""
+        hit, value = self.lookup(key)
+        if hit:
+            self.record(name, "hit", 0.0)
+            return value
+        t0 = time.perf_counter()
+        with span(f"stage.{name}"):
+            value = fn(*args, **kwargs)
+        self.put(key, value, ttl)
+        self.record(name, "miss", time.perf_counter() - t0)
+        return value
+
+    def timings(self) -> pd.DataFrame:
+        """Stages touched in this run, in the order they completed."""
+        df = pd.DataFrame(self.log, columns=["Stage", "Cache", "Status", "Seconds"])
+        return df.set_index("Stage")
+
+    def clear(self) -> None:
+        self.entries.clear()
@@ -0,0 +1,286 @@
+import json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from instrumentation import span
+
+STORE_DIR = os.getenv("RISK_PRICE_STORE", os.path.join(os.path.expanduser("~"), ".ai_risk_report", "prices"))
+ROW_DTYPE = np.dtype([("date", "M8[D]"), ("close", "f8")])
+ADJUST_TOL = 1e-4  # relative change of a re-downloaded stored close that means Yahoo re-adjusted the history
+
+
+def extract_close(data, syms: list[str]) -> pd.DataFrame:
+    """Pull the (auto-adjusted) close panel out of a `yf.download` result."""
+    if data is None or data.empty:
+        return pd.DataFrame()
+
+    # If single column DataFrame or Series
+    if isinstance(data, pd.Series):
+        return data.to_frame(name=syms[0])
+
+    # Try simple flat columns first
+    if "Close" in data.columns:
+        close = data["Close"]
+    elif "Adj Close" in data.columns:
+        close = data["Adj Close"]
+    # Handle MultiIndex (level 0: field, level 1: ticker)
+    elif isinstance(data.columns, pd.MultiIndex):
+        lvl0 = set(data.columns.get_level_values(0))
+        if "Close" in lvl0:
+            close = data.xs("Close", axis=1, level=0, drop_level=True)
+        elif "Adj Close" in lvl0:
+            close = data.xs("Adj Close", axis=1, level=0, drop_level=True)
+        else:
+            # last fallback: pick the last level that looks like close
+            candidates = [k for k in lvl0 if k.lower().startswith("close")]
+            if candidates:
+                close = data.xs(candidates[0], axis=1, level=0, drop_level=True)
+            else:
+                raise KeyError(f"No Close/Adj Close in columns: {lvl0}")
+    else:
+        raise KeyError(f"Unexpected columns: {list(data.columns)}")
+
+    if isinstance(close, pd.Series):
+        close = close.to_frame(name=syms[0])
+
+    # Clean up empty columns (e.g., invalid tickers)
+    return close.dropna(how="all", axis=1)
+
+
+class PriceStore:
+    """Columnar close-price cache: one memory-mappable `.npy` partition per ticker.
+
+    `meta.json` records the date range each ticker has been fetched for, so a
+    ticker that IPO'd after `start` is not re-requested on every call, nor is a
+    top-up that came back empty only because the market was closed. Batches
+    download concurrently, which needs yfinance >= 1.0 (earlier versions share
+    one module-global result dict across `yf.download` calls).
+
+    Closes are split/dividend adjusted, and Yahoo re-adjusts the whole history
+    after every corporate action. Each top-up re-downloads the last completed
+    stored bar; if it no longer matches, the ticker's full range is fetched
+    again instead of splicing new bars onto old-scale history.
+    """
+
+    def __init__(self, root: str = STORE_DIR, batch_size: int = 50, max_workers: int = 4):
+        self.root = root
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.last_stats: dict = {}
+        self._lock = threading.Lock()  # meta.json and partition read-merge-writes (sessions share the store)
+        os.makedirs(root, exist_ok=True)
+
+    # -- partitions ---------------------------------------------------------
+    def _path(self, sym: str) -> str:
+        return os.path.join(self.root, sym.replace("/", "_") + ".npy")
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.root, "meta.json")
+
+    def _load_meta(self) -> dict:
+        try:
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _tmp(path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # concurrent writers never share a temp file
+
+    def _update_meta(self, changes: dict) -> None:
+        """Merge `changes` into meta.json as it is on disk now, so concurrent updates are not lost."""
+        with self._lock:
+            meta = self._load_meta()
+            meta.update(changes)
+            tmp = self._tmp(self._meta_path())
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=0, sort_keys=True)
+            os.replace(tmp, self._meta_path())
+
+    def _read_partition(self, sym: str) -> np.ndarray | None:
+        try:
+            return np.load(self._path(sym), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def _write_partition(self, sym: str, s: pd.Series, replace: bool = False) -> None:
+        """Merge `s` into the ticker's partition (new bars win on overlapping dates), or replace it."""
+        s = s.dropna()
+        new = np.empty(len(s), dtype=ROW_DTYPE)
+        new["date"] = s.index.values.astype("M8[D]")
+        new["close"] = s.values.astype("f8")
+        with self._lock:
+            old = None if replace else self._read_partition(sym)
+            if old is not None and len(old):
+                keep = np.asarray(old[old["date"] < new["date"][0]]) if len(new) else np.asarray(old)
+                rows = np.concatenate([keep, new])
+            else:
+                rows = new
+            tmp = self._tmp(self._path(sym)) + ".npy"
+            np.save(tmp, rows)
+            os.replace(tmp, self._path(sym))
+
+    def _rescaled(self, sym: str, s: pd.Series, day: date) -> bool:
+        """True if the freshly downloaded close for `day` differs from the stored one (history re-adjusted)."""
+        rows = self._read_partition(sym)
+        s = s.dropna()
+        day64 = np.datetime64(day, "D")
+        if rows is None or not len(rows):
+            return False
+        i = np.searchsorted(rows["date"], day64)
+        j = np.flatnonzero(s.index.values.astype("M8[D]") == day64)
+        if i == len(rows) or rows["date"][i] != day64 or not len(j):
+            return False
+        return abs(float(s.iloc[j[0]]) / float(rows["close"][i]) - 1.0) > ADJUST_TOL
+
+    def read(self, syms: list[str], start=None) -> pd.DataFrame:
+        """Close panel for `syms` straight from disk (no network)."""
+        start64 = np.datetime64(str(start), "D") if start is not None else None
+        cols = {}
+        for sym in syms:
+            rows = self._read_partition(sym)
+            if rows is None or not len(rows):
+                continue
+            if start64 is not None:
+                rows = rows[np.searchsorted(rows["date"], start64):]
+            cols[sym] = pd.Series(np.asarray(rows["close"]), index=pd.DatetimeIndex(rows["date"]))
+        if not cols:
+            return pd.DataFrame()
+        close = pd.DataFrame(cols)
+        close.index.name = "Date"
+        return close
+
+    # -- network top-up -----------------------------------------------------
+    def _plan(self, syms: list[str], start: date, today: date, meta: dict) -> dict[date, list[str]]:
+        """Group tickers by the first date that still has to be fetched."""
+        plan: dict[date, list[str]] = {}
+        for sym in syms:
+            m = meta.get(sym)
+            if m is None or date.fromisoformat(m["from"]) > start:
+                fetch_from = start  # missing ticker (or history too short): full range
+            elif date.fromisoformat(m["to"]) < today:
+                # Overlap from the last completed stored bar: it is compared to spot re-adjusted history,
+                # and the bar after it (possibly stored mid-session) gets replaced
+                fetch_from = self._overlap_from(sym, date.fromisoformat(m["to"]))
+            else:
+                continue
+            plan.setdefault(fetch_from, []).append(sym)
+        return plan
+
+    def _overlap_from(self, sym: str, to: date) -> date:
+        """Date of the second-to-last stored bar (the last one may have been partial), at most `to`."""
+        rows = self._read_partition(sym)
+        if rows is None or len(rows) < 2:
+            return to
+        return min(to, date.fromisoformat(str(rows["date"][-2])))
+
+    def _download(self, syms: list[str], start: date, end: date | None = None) -> pd.DataFrame:
+        # auto_adjust=True returns already-adjusted prices under "Close"; `end` is exclusive
+        data = yf.download(
+            syms,
+            start=str(start),
+            end=None if end is None else str(end),
+            progress=False,
+            auto_adjust=True,
+            threads=False,
+        )
+        return extract_close(data, syms)
+
+    def fetch_window(self, syms: list[str], start, end) -> pd.DataFrame:
+        """Closes for a past window (`end` inclusive) straight from Yahoo, in batches; nothing is stored.
+
+        Partitions hold one contiguous range per ticker, so old windows that lie
+        before the stored range are not merged into them.
+        """
+        start, end = date.fromisoformat(str(start)), date.fromisoformat(str(end))
+        batches = [syms[i:i + self.batch_size] for i in range(0, len(syms), self.batch_size)]
+        if not batches:
+            return pd.DataFrame()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            parts = list(pool.map(lambda b: self._download(b, start, end + timedelta(days=1)), batches))
+        parts = [p for p in parts if not p.empty]
+        return pd.concat(parts, axis=1) if parts else pd.DataFrame()
+
+    def _fetch(self, jobs: list[tuple[list[str], date]], meta: dict, start: date, today: date,
+               replace: bool = False) -> tuple[int, dict, list[str]]:
+        """Download and store `jobs`; returns (bars stored, meta changes, tickers whose history was re-adjusted)."""
+        with span("prices.yfinance", batches=len(jobs)) as sp, \
+             ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            results = list(pool.map(lambda job: self._download(*job), jobs))
+            sp.add(rows=sum(int(c.notna().sum().sum()) for c in results))
+        fetched, changes, rescaled = 0, {}, []
+        for (batch, fetch_from), close in zip(jobs, results):
+            for sym in batch:
+                m = meta.get(sym)
+                top_up = not replace and m is not None and date.fromisoformat(m["from"]) <= start
+                if sym not in close.columns:
+                    # An empty batch is what yfinance returns when throttled or offline, so a missing ticker
+                    # only counts as up to date if others did come back or the gap has no trading days
+                    if top_up and (not close.empty or not np.busday_count(
+                            date.fromisoformat(m["to"]) + timedelta(days=1), today + timedelta(days=1))):
+                        changes[sym] = {"from": m["from"], "to": today.isoformat()}
+                    continue  # a new ticker with nothing back (bad ticker or throttled): retry next time
+                if top_up and self._rescaled(sym, close[sym], fetch_from):
+                    rescaled.append(sym)
+                    continue
+                self._write_partition(sym, close[sym], replace=replace)
+                fetched += int(close[sym].notna().sum())
+                first = fetch_from if m is None or replace else min(fetch_from, date.fromisoformat(m["from"]))
+                changes[sym] = {"from": first.isoformat(), "to": today.isoformat()}
+        return fetched, changes, rescaled
+
+    def get(self, syms: list[str], start) -> pd.DataFrame:
+        """Read cached closes, fetch only missing tickers / trailing dates, append, return the panel."""
+        t0 = time.perf_counter()
+        start = start if isinstance(start, date) else date.fromisoformat(str(start))
+        today = date.today()
+        meta = self._load_meta()
+        plan = self._plan(syms, start, today, meta)
+
+        jobs = []
+        for fetch_from, group in plan.items():
+            for i in range(0, len(group), self.batch_size):
+                jobs.append((group[i:i + self.batch_size], fetch_from))
+
+        fetched, refetched = 0, []
+        if jobs:
+            fetched, changes, refetched = self._fetch(jobs, meta, start, today)
+            if refetched:
+                # split or dividend since the last top-up: the stored scale is stale, replace the whole range
+                again = [(refetched[i:i + self.batch_size], start) for i in range(0, len(refetched), self.batch_size)]
+                n, more, _ = self._fetch(again, meta, start, today, replace=True)
+                fetched += n
+                changes.update(more)
+            if changes:
+                self._update_meta(changes)
+        t_fetch = time.perf_counter() - t0
+
+        close = self.read(syms, start)
+        self.last_stats = {
+            "tickers": len(syms),
+            "tickers_fetched": sum(len(b) for b, _ in jobs),
+            "tickers_readjusted": len(refetched),
+            "batches": len(jobs),
+            "bars_fetched": fetched,
+            "bars_cached": int(close.notna().sum().sum()) - fetched if not close.empty else 0,
+            "warm": not jobs,
+            "fetch_s": round(t_fetch, 3),
+            "total_s": round(time.perf_counter() - t0, 3),
+        }
+        return close
+
+_default_store: PriceStore | None = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> PriceStore:
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = PriceStore()
+        return _default_store
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from utils import (
+    compute_risk_metrics, to_markdown_table, compute_portfolio_returns, var_es, rolling_var_es,
+    stress_scenarios, historical_worst_days, portfolio_summary
+)
+from montecarlo import parametric_var_es, mc_var_es, fhs_var_es
+from correlation import FULL_MATRIX_MAX, correlation_summary, ledoit_wolf, pairwise_cov
+
+VAR_METHODS = ["None", "Parametric (normal)", "Monte Carlo (normal)", "Monte Carlo (Student-t)",
+               "Filtered historical simulation"]
+
+
+def held_tickers(weights, columns) -> list:
+    """Tickers the portfolio actually holds (every column for equal weight)."""
+    if weights is None:
+        return list(columns)
+    w = weights.reindex(columns).fillna(0.0)
+    return list(w.index[w != 0]) or list(columns)
+
+
+def model_var_es(method: str, metrics: dict, weights, n_paths: int = 100_000, seed: int = 42, n_workers: int = 1,
+                 shrink: bool = False):
+    """Model VaR/ES for one of VAR_METHODS -> (table, simulation stats); (None, None) for "None".
+
+    Only the portfolio's own tickers enter the model: the covariance is built
+    here, over those columns, and only for the methods that need it. `shrink`
+    swaps the sample covariance for the Ledoit-Wolf estimate; the shrinkage
+    intensity is added to the stats.
+    """
+    if method not in VAR_METHODS[1:]:
+        return None, None
+    sim_kw = dict(n_paths=int(n_paths), seed=int(seed), n_workers=n_workers)
+    rets = metrics["returns"][held_tickers(weights, metrics["returns"].columns)]
+    if method == "Filtered historical simulation":
+        return fhs_var_es(rets, weights, **sim_kw)
+    mean, extra = metrics["mean"].reindex(rets.columns), {}
+    if shrink:
+        lw, intensity = ledoit_wolf(rets)
+        cov, extra = pd.DataFrame(lw, index=rets.columns, columns=rets.columns), {"shrinkage": intensity}
+    else:
+        cov = pd.DataFrame(pairwise_cov(rets.to_numpy(dtype=float, na_value=np.nan)),
+                           index=rets.columns, columns=rets.columns)
+    if method == "Parametric (normal)":
+        return parametric_var_es(mean, cov, weights), (extra or None)
+    dist = "t" if method == "Monte Carlo (Student-t)" else "normal"
+    df, stats = mc_var_es(mean, cov, weights, dist=dist, **sim_kw)
+    return df, {**stats, **extra}
+
+
+def metric_tables(metrics: dict) -> dict:
+    """Per-ticker display tables out of `compute_risk_metrics`."""
+    mdd = metrics["mdd"].to_frame("Max Drawdown")
+    mdd["Peak"] = metrics["mdd_peak"].reindex(mdd.index).dt.date
+    mdd["Trough"] = metrics["mdd_trough"].reindex(mdd.index).dt.date
+    mdd["Obs"] = metrics["n_obs"].reindex(mdd.index)
+    return {
+        "ann_vol": metrics["ann_vol"].to_frame("Annualized Volatility"),
+        "sharpe": metrics["sharpe"].to_frame("Sharpe (naive)"),
+        "mdd": mdd,
+        "corr": metrics["corr"],
+    }
+
+
+def correlation_tables(metrics: dict, k: int = 10, min_corr: float = 0.5) -> dict:
+    """Top pairs and MST clusters, reusing the matrix `compute_risk_metrics` already built."""
+    return correlation_summary(metrics["returns"], k=k, min_corr=min_corr, corr=metrics["corr"].to_numpy())
+
+
+def portfolio_tables(prices: pd.DataFrame, weights_matrix: pd.DataFrame):
+    """All portfolios of a weights matrix at once: tidy summary table and long worst-days table."""
+    port_rets = compute_portfolio_returns(prices, weights_matrix)
+    return portfolio_summary(port_rets), historical_worst_days(port_rets, k=5)
+
+
+def stress_tables(prices: pd.DataFrame, port: pd.Series, weights, library: pd.DataFrame | None = None):
+    return stress_scenarios(prices, weights, library=library), historical_worst_days(port, k=5)
+
+
+def analyze(prices: pd.DataFrame, weights: pd.Series | pd.DataFrame | None = None, var_window: int = 250,
+            var_method: str = "None", mc_paths: int = 100_000, mc_seed: int = 42, do_var: bool = True,
+            do_stress: bool = True, library: pd.DataFrame | None = None, n_workers: int = 1,
+            shrink_cov: bool = False) -> dict:
+    """Every analytics table of the report for one price panel (no Streamlit, no caching).
+
+    A weights matrix adds the portfolio comparison; its first portfolio is the
+    one used for VaR and stress detail.
+    """
+    metrics = compute_risk_metrics(prices)
+    r = metric_tables(metrics)
+    r["corr_summary"] = correlation_tables(metrics)
+    detail = weights
+    if isinstance(weights, pd.DataFrame):
+        r["book"], r["book_worst"] = portfolio_tables(prices, weights)
+        r["detail_portfolio"] = weights.columns[0]
+        detail = weights.iloc[:, 0]
+    port = compute_portfolio_returns(prices, detail)
+    if do_var:
+        r["var_df"] = var_es(port)
+        r["roll_df"], r["backtest_df"] = rolling_var_es(port, window=int(var_window))
+        r["var_window"], r["var_method"] = int(var_window), var_method
+        r["model_var_df"], r["model_stats"] = model_var_es(var_method, metrics, detail, mc_paths, mc_seed,
+                                                           n_workers, shrink_cov)
+    if do_stress:
+        r["shocks_df"], r["worst_df"] = stress_tables(prices, port, detail, library)
+    return r
+
+
+def correlation_markdown(corr: pd.DataFrame, summary: dict | None) -> str:
+    """Full matrix only for small universes; otherwise (and always, given a summary) the compact view."""
+    if summary is None or len(corr) <= 2:
+        return "### Correlation Matrix\n\n" + corr.to_markdown() + "\n"
+    parts = [f"### Correlation\n\nAverage pairwise correlation {summary['avg_corr']:.3f} "
+             f"across {len(corr)} tickers.\n"]
+    if len(corr) <= FULL_MATRIX_MAX:
+        parts.append(corr.to_markdown() + "\n")
+    parts.append("\n**Most correlated pairs**\n\n" + summary["most"].to_markdown(index=False) + "\n")
+    parts.append("\n**Least correlated pairs**\n\n" + summary["least"].to_markdown(index=False) + "\n")
+    if not summary["cluster_table"].empty:
+        rule = f"chains with correlation >= {summary['min_corr']:.2f}" if summary["min_corr"] is not None else "MST cut"
+        parts.append(f"\n**Clusters (single linkage, {rule})**\n\n" + summary["cluster_table"].to_markdown() + "\n")
+    return "\n".join(parts)
+
+
+def render_markdown(r: dict) -> str:
+    """Markdown report from an `analyze`-style dict.
+
+    Optional keys: `tickers`, `start`, `esg` ({ticker: DataFrame}), `sec_md`,
+    `asx_md` and `sources` (list of "- ..." lines). VaR and stress sections are
+    included when their tables are present.
+    """
+    md_parts = []
+    md_parts.append(f"# Risk Report\n\n**Tickers:** {r.get('tickers', '')}\n\n**Period Start:** {r.get('start', '')}\n")
+    md_parts.append(to_markdown_table(r["ann_vol"], "Annualized Volatility"))
+    md_parts.append(to_markdown_table(r["sharpe"], "Sharpe (naive)"))
+    md_parts.append(to_markdown_table(r["mdd"], "Max Drawdown"))
+    md_parts.append(correlation_markdown(r["corr"], r.get("corr_summary")))
+    if r.get("book") is not None:
+        md_parts.append(to_markdown_table(r["book"], f"Portfolio Comparison ({len(r['book'])} portfolios)"))
+    if r.get("var_df") is not None:
+        md_parts.append("\n## VaR / ES (Historical)\n")
+        if r.get("detail_portfolio") is not None:
+            md_parts.append(f"Portfolio: **{r['detail_portfolio']}**\n\n")
+        md_parts.append(r["var_df"].to_markdown() + "\n")
+        if r.get("model_var_df") is not None:
+            shrinkage = (r.get("model_stats") or {}).get("shrinkage")
+            label = r["var_method"] + (f", Ledoit-Wolf covariance (shrinkage {shrinkage:.2f})"
+                                       if shrinkage is not None else "")
+            md_parts.append(f"\n**{label}**\n\n")
+            md_parts.append(r["model_var_df"].to_markdown() + "\n")
+        if r.get("backtest_df") is not None and not r["backtest_df"].empty:
+            md_parts.append(f"\n**Rolling {r['var_window']}-day VaR backtest (Kupiec / Christoffersen)**\n\n")
+            md_parts.append(r["backtest_df"].to_markdown() + "\n")
+    if r.get("shocks_df") is not None:
+        md_parts.append("\n## Stress Scenarios\n")
+        md_parts.append(r["shocks_df"].to_markdown() + "\n")
+        md_parts.append("\n**Worst Daily Returns**\n\n")
+        md_parts.append(r["worst_df"].to_markdown() + "\n")
+    if r.get("esg"):
+        md_parts.append("\n## ESG Metrics (Yahoo Sustainability)\n")
+        for tk, df_esg in r["esg"].items():
+            md_parts.append(f"\n**{tk}**\n")
+            md_parts.append(df_esg.to_markdown() + "\n")
+    if r.get("sec_md") or r.get("asx_md"):
+        md_parts.append("\n## Disclosure Summaries (AI)\n")
+        if r.get("sec_md"):
+            md_parts.append("\n**SEC**\n")
+            md_parts.append(r["sec_md"] + "\n")
+        if r.get("asx_md"):
+            md_parts.append("\n**ASX**\n")
+            md_parts.append(r["asx_md"] + "\n")
+
+    # Sources
+    md_parts.append("## Sources\n")
+    md_parts.append("- Yahoo Finance via `yfinance` for prices\n")
+    md_parts.extend(line + "\n" for line in r.get("sources", []))
+    return "\n".join(md_parts)
@@ -0,0 +1,137 @@
+import json, os, threading, time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# Named historical stress windows (peak-to-trough of the broad US equity market)
+HISTORICAL_WINDOWS = {
+    "GFC 2008 (Lehman)": ("2008-09-12", "2008-11-20"),
+    "Euro debt 2011": ("2011-07-22", "2011-10-03"),
+    "China deval 2015": ("2015-08-17", "2015-08-25"),
+    "Q4 2018 selloff": ("2018-09-20", "2018-12-24"),
+    "COVID 2020": ("2020-02-19", "2020-03-23"),
+    "Rate shock 2022": ("2022-01-03", "2022-10-12"),
+}
+REPLAY_NO_DATA_TTL = 7 * 86400  # tickers without prices in a window are asked again after a week
+
+
+def uniform_shocks(tickers, shocks=(-0.05, -0.10, -0.20)) -> pd.DataFrame:
+    """Same shock to every ticker; one row per scenario."""
+    return pd.DataFrame({f"Shock {int(s*100)}%": [s] * len(tickers) for s in shocks}, index=list(tickers)).T
+
+
+def betas(rets: pd.DataFrame, market: pd.Series | None = None) -> pd.Series:
+    """NaN-aware betas vs `market` (equal-weight average of `rets` if None)."""
+    if market is None:
+        market = rets.mean(axis=1)
+    r = rets.to_numpy(dtype=float)
+    m = market.reindex(rets.index).to_numpy(dtype=float)[:, None]
+    ok = ~np.isnan(r) & ~np.isnan(m)
+    n = ok.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rm = np.where(ok, m, 0.0).sum(axis=0) / n
+        ri = np.where(ok, r, 0.0).sum(axis=0) / n
+        cov = np.where(ok, (r - ri) * (m - rm), 0.0).sum(axis=0)
+        var = np.where(ok, (m - rm) ** 2, 0.0).sum(axis=0)
+        return pd.Series(cov / var, index=rets.columns)
+
+
+def beta_shocks(rets: pd.DataFrame, market_shocks=(-0.10, -0.20), market: pd.Series | None = None) -> pd.DataFrame:
+    """Market move scaled per ticker by its beta."""
+    b = betas(rets, market).fillna(1.0)
+    return pd.DataFrame({f"Market {int(s*100)}% (beta)": b * s for s in market_shocks}).T
+
+
+def historical_library(prices: pd.DataFrame, windows: dict = HISTORICAL_WINDOWS) -> pd.DataFrame:
+    """Per-ticker total return over each named window; windows the history does not cover are dropped."""
+    rows = {}
+    for name, (start, end) in windows.items():
+        seg = prices.loc[start:end]
+        if len(seg) < 2:
+            continue
+        first = seg.bfill().iloc[0]
+        last = seg.ffill().iloc[-1]
+        # only tickers priced in the first week of the window count as covered
+        covered = seg.iloc[:5].notna().any()
+        ret = (last / first - 1.0).where(covered)
+        if ret.notna().any():
+            rows[f"Replay: {name}"] = ret
+    return pd.DataFrame(rows).T.reindex(columns=prices.columns)
+
+
+def library_from_store(store, syms, windows: dict = HISTORICAL_WINDOWS, fetch: bool = True) -> pd.DataFrame:
+    """Historical replay library for `syms`, whatever start date the report itself uses.
+
+    Window returns are fixed history, so they are kept in `replays.json` next
+    to the price store: each ticker's windows are downloaded once, and only
+    the windows' own dates (not the years in between). A ticker with no prices
+    in a window (listed later) is asked again after REPLAY_NO_DATA_TTL; failed
+    downloads are not recorded. `fetch=False` uses the cached returns only.
+    """
+    path = os.path.join(store.root, "replays.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    now = time.time()
+
+    def fresh(sym):
+        e = cache.get(sym)
+        if e is None or set(e["returns"]) != set(windows):
+            return False
+        return None not in e["returns"].values() or now - e["fetched"] < REPLAY_NO_DATA_TTL
+
+    todo = [s for s in dict.fromkeys(syms) if not fresh(s)] if fetch else []
+    if todo:
+        got, failed = {s: {} for s in todo}, set()
+        with span("prices.replays", windows=len(windows)) as sp:
+            for name, (start, end) in windows.items():
+                try:
+                    close = store.fetch_window(todo, start, end)
+                except Exception:
+                    failed.update(todo)
+                    continue
+                row = pd.Series(np.nan, index=todo)
+                if not close.empty:
+                    sp.add(rows=int(close.notna().sum().sum()))
+                    lib = historical_library(close.reindex(columns=todo), {name: (start, end)})
+                    row = lib.iloc[0] if len(lib) else row
+                for s in todo:
+                    got[s][name] = None if pd.isna(row.get(s)) else float(row[s])
+        for s in todo:
+            if s not in failed:
+                cache[s] = {"fetched": now, "returns": got[s]}
+        try:
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    rows = {f"Replay: {name}": [cache.get(s, {}).get("returns", {}).get(name) for s in syms] for name in windows}
+    lib = pd.DataFrame(rows, index=list(syms), dtype=float).T
+    return lib.dropna(how="all")
+
+
+def revalue(scenarios: pd.DataFrame, weights: pd.Series | pd.DataFrame) -> pd.DataFrame:
+    """Portfolio P&L (%) for every scenario x portfolio in one matrix product.
+
+    `scenarios` is (scenario x ticker) returns; `weights` is a Series (one
+    portfolio) or a (ticker x portfolio) DataFrame. Missing shocks count as 0;
+    for a single portfolio a `Coverage` column gives the share of gross weight
+    that actually had a shock.
+    """
+    single = isinstance(weights, pd.Series)
+    W = (weights.to_frame("Portfolio") if single else weights).reindex(scenarios.columns).fillna(0.0)
+    S = scenarios.to_numpy(dtype=float)
+    has = ~np.isnan(S)
+    w = W.to_numpy(dtype=float)
+    out = pd.DataFrame(np.where(has, S, 0.0) @ w * 100.0, index=scenarios.index, columns=W.columns)
+    if single:
+        gross = np.abs(w[:, 0])
+        out["Coverage"] = has @ gross / gross.sum() if gross.sum() else np.nan
+    return out
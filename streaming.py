@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from price_store import extract_close
+from utils import var_es
+
+# Bars per US trading session for yfinance intraday intervals
+BARS_PER_DAY = {"1m": 390, "2m": 195, "5m": 78, "15m": 26, "30m": 13, "60m": 6.5, "90m": 13 / 3}
+
+
+def intraday_ann_factor(interval: str) -> float:
+    return 252.0 * BARS_PER_DAY[interval]
+
+
+def poll_bars(tickers: list[str], interval: str = "1m", since=None, period: str = "1d") -> pd.DataFrame:
+    """Completed intraday close bars; the bar still forming is left out.
+
+    With `since` (e.g. `RiskState.last_ts`; naive times are exchange-local,
+    as yfinance reads them) only bars from that one on are requested, so a
+    poll downloads what arrived since the last one rather than the whole
+    session; otherwise today's session (`period`).
+    """
+    window = {"period": period} if since is None else {"start": pd.Timestamp(since)}
+    data = yf.download(tickers, interval=interval, progress=False, auto_adjust=True, threads=False, **window)
+    close = extract_close(data, tickers)
+    return close.iloc[:-1] if len(close) > 1 else close.iloc[:0]
+
+
+class RiskState:
+    """Risk metrics kept up to date bar by bar instead of recomputed from the whole history.
+
+    Per bar, mean/volatility/Sharpe (Welford), drawdown (running max) and the
+    portfolio return ring buffer behind VaR cost O(assets); the pairwise
+    covariance sums cost O(assets^2). Definitions follow `compute_risk_metrics`:
+    a return needs this bar's and the previous bar's price, statistics use each
+    ticker's own returns, covariance/correlation use pairwise-complete bars, and
+    portfolio returns come from forward-filled prices, scaled up to the gross
+    weight while some tickers have not traded yet.
+    """
+
+    def __init__(self, tickers, weights: pd.Series | None = None, ann_factor: float = 252.0,
+                 var_window: int = 250, alphas=(0.95, 0.99)):
+        self.tickers = list(tickers)
+        N = len(self.tickers)
+        self.ann_factor = float(ann_factor)
+        self.alphas = alphas
+        if weights is None:
+            weights = pd.Series(1.0 / N, index=self.tickers)
+        self.weights = weights.reindex(self.tickers).fillna(0.0).to_numpy(dtype=float)
+        self.last_ts = None
+        self.n_bars = 0
+        self._last_px = np.full(N, np.nan)
+        # Welford accumulators
+        self._n = np.zeros(N, dtype=np.int64)
+        self._mean = np.zeros(N)
+        self._m2 = np.zeros(N)
+        # Drawdown
+        self._run_max = np.full(N, np.nan)
+        self._max_ts = np.full(N, None, dtype=object)
+        self._mdd = np.zeros(N)
+        self._peak = np.full(N, None, dtype=object)
+        self._trough = np.full(N, None, dtype=object)
+        # Pairwise sums of returns shifted by each ticker's first return (keeps the sums from cancelling)
+        self._shift = np.full(N, np.nan)
+        self._pn = np.zeros((N, N))
+        self._sx = np.zeros((N, N))  # sum of x_i over bars where j also has a return
+        self._sxx = np.zeros((N, N))
+        self._sxy = np.zeros((N, N))
+        # Portfolio returns for VaR
+        self._ring = np.full(int(var_window), np.nan)
+        self._last_ff = np.full(N, np.nan)  # last known price per ticker
+        self._ring_pos = 0
+
+    @classmethod
+    def from_prices(cls, prices: pd.DataFrame, **kwargs) -> "RiskState":
+        state = cls(prices.columns, **kwargs)
+        state.update_many(prices)
+        return state
+
+    def update(self, ts, prices) -> bool:
+        """Ingest one bar of prices (aligned with `tickers`); a bar at or before `last_ts` is ignored."""
+        return self._ingest(pd.DatetimeIndex([ts]), np.asarray(prices, dtype=float).reshape(1, -1)) == 1
+
+    def update_many(self, prices: pd.DataFrame) -> int:
+        """Ingest a (time x ticker) block of bars in one vectorised step; returns the number of new bars."""
+        block = prices.reindex(columns=self.tickers).to_numpy(dtype=float, na_value=np.nan)
+        return self._ingest(pd.DatetimeIndex(prices.index), block)
+
+    def _ingest(self, times: pd.DatetimeIndex, X: np.ndarray) -> int:
+        if times.tz is not None:
+            times = times.tz_localize(None)  # exchange-local wall clock
+        if self.last_ts is not None:
+            keep = times > self.last_ts
+            times, X = times[keep], X[keep]
+        B = len(X)
+        if not B:
+            return 0
+        cols = np.arange(X.shape[1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            R = X / np.vstack([self._last_px, X[:-1]]) - 1.0
+        V = ~np.isnan(R)
+
+        # Welford: merge the block's count/mean/M2 into the running ones (Chan et al.)
+        nb = V.sum(axis=0)
+        if nb.any():
+            Z = np.where(V, R, 0.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mb = np.where(nb > 0, Z.sum(axis=0) / nb, 0.0)
+            m2b = (np.where(V, R - mb, 0.0) ** 2).sum(axis=0)
+            na = self._n
+            n = na + nb
+            with np.errstate(divide="ignore", invalid="ignore"):
+                delta = mb - self._mean
+                self._mean = np.where(n > 0, self._mean + delta * nb / n, 0.0)
+                self._m2 = np.where(n > 0, self._m2 + m2b + delta * delta * na * nb / n, 0.0)
+            self._n = n
+
+            first = np.isnan(self._shift) & (nb > 0)
+            self._shift[first] = R[V.argmax(axis=0), cols][first]
+            Y = np.where(V, R - self._shift, 0.0)
+            Vf = V.astype(float)
+            self._pn += Vf.T @ Vf
+            self._sx += Y.T @ Vf
+            self._sxx += (Y * Y).T @ Vf
+            self._sxy += Y.T @ Y
+
+        # Portfolio returns on forward-filled prices, as in compute_portfolio_returns
+        F = pd.DataFrame(np.vstack([self._last_ff, X])).ffill().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            RF = F[1:] / F[:-1] - 1.0
+            hasf = ~np.isnan(RF)
+            scale = np.abs(self.weights).sum() / (hasf @ np.abs(self.weights))
+            port = (np.where(hasf, RF, 0.0) @ self.weights * scale)[np.isfinite(scale)]
+        self._last_ff = F[-1]
+        W = len(self._ring)
+        self._ring_pos += max(len(port) - W, 0)  # older returns would be overwritten anyway
+        for p in port[-W:]:
+            self._ring[self._ring_pos % W] = p
+            self._ring_pos += 1
+
+        # Drawdown: running max carried over from the previous block
+        has = ~np.isnan(X)
+        first_px = np.isnan(self._run_max) & has.any(axis=0)
+        t_first = times.values[has.argmax(axis=0)]
+        self._peak[first_px] = self._trough[first_px] = t_first[first_px]
+        self._max_ts[first_px] = t_first[first_px]
+        run = np.fmax.accumulate(np.vstack([self._run_max, X]), axis=0)[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dd = X / run - 1.0
+        dd[np.isnan(dd)] = 0.0
+        trough = dd.argmin(axis=0)
+        low = dd[trough, cols]
+        worse = low < self._mdd
+        # The peak is the first bar where the running max reached its level at the trough
+        level = run[trough, cols]
+        reached = (run >= level).argmax(axis=0)
+        from_block = worse & (level > np.nan_to_num(self._run_max, nan=-np.inf))
+        self._mdd[worse] = low[worse]
+        self._trough[worse] = times.values[trough][worse]
+        self._peak[worse] = self._max_ts[worse]  # level set in an earlier block
+        self._peak[from_block] = times.values[reached][from_block]
+        new_high = has.any(axis=0) & (run[-1] > np.nan_to_num(self._run_max, nan=-np.inf))
+        self._max_ts[new_high] = times.values[(run >= run[-1]).argmax(axis=0)][new_high]
+        self._run_max = run[-1]
+
+        self._last_px = X[-1]
+        self.last_ts = times[-1]
+        self.n_bars += B
+        return B
+
+    def var_es(self) -> pd.DataFrame:
+        """Historical VaR/ES over the last `var_window` portfolio returns."""
+        n = min(self._ring_pos, len(self._ring))
+        window = np.roll(self._ring, -self._ring_pos)[-n:] if n else self._ring[:0]
+        return var_es(pd.Series(window), self.alphas)
+
+    def metrics(self) -> dict:
+        """Current metrics keyed like `compute_risk_metrics` (no `returns`), plus the running `cov`."""
+        cols = pd.Index(self.tickers)
+        n = self._n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(n > 0, self._mean, np.nan)
+            std = np.sqrt(self._m2 / (n - 1))
+            std[n < 2] = np.nan
+            pn, sx, sxx, sxy = self._pn, self._sx, self._sxx, self._sxy
+            sy, syy = sx.T, sxx.T
+            cov = (sxy - sx * sy / pn) / (pn - 1)
+            corr = (pn * sxy - sx * sy) / np.sqrt((pn * sxx - sx * sx) * (pn * syy - sy * sy))
+        cov[pn < 2] = np.nan
+        corr[pn < 2] = np.nan
+        np.clip(corr, -1.0, 1.0, out=corr)
+        has_px = ~np.isnan(self._run_max)
+        dates = lambda a: pd.Series(pd.to_datetime(list(a)), index=cols)
+        return {
+            "n_obs": pd.Series(n, index=cols),
+            "mean": pd.Series(mean, index=cols),
+            "cov": pd.DataFrame(cov, index=cols, columns=cols),
+            "ann_vol": pd.Series(std * np.sqrt(self.ann_factor), index=cols).sort_values(ascending=False),
+            "sharpe": pd.Series(mean / std * np.sqrt(self.ann_factor), index=cols).sort_values(ascending=False),
+            "mdd": pd.Series(np.where(has_px, self._mdd, np.nan), index=cols).sort_values(),
+            "mdd_peak": dates(self._peak),
+            "mdd_trough": dates(self._trough),
+            "corr": pd.DataFrame(corr, index=cols, columns=cols),
+        }
@@ -1,26 +1,104 @@
-import os, requests
-from bs4 import BeautifulSoup
+import os, re, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import Optional, List
 
-def fetch_url_text(url: str, max_len: int = 20000, timeout: int = 15) -> str:
+import requests
+
+from http_client import get_client, RateLimiter
+from html_extract import decode_chunks, extract_text
+from summary_cache import get_summary_cache
+from instrumentation import span, traced, record, bind
+
+# Account limits for the LLM endpoint; override to match your OpenAI tier.
+LLM_RPM = float(os.getenv("OPENAI_RPM", "500"))
+LLM_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+_rpm_limiter = RateLimiter(LLM_RPM / 60.0, burst=max(1.0, LLM_RPM / 60.0))
+_tpm_limiter = RateLimiter(LLM_TPM / 60.0, burst=LLM_TPM / 60.0)
+
+_clients: dict = {}
+_clients_lock = threading.Lock()
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None):
+    """One shared OpenAI client per (key, endpoint). `base_url`/OPENAI_BASE_URL can point at a local stub."""
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            from openai import OpenAI
+            client = _clients[(api_key, base_url)] = OpenAI(api_key=api_key, base_url=base_url)
+        return client
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """tiktoken encoding for `model`, or None if it can't be loaded (e.g. offline first run)."""
     try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent": "AI-Risk-Report/1.0 (contact: you@example.com)"})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        for tag in soup(["script", "style", "noscript"]):
-            tag.extract()
-        text = " ".join(soup.get_text(separator=" ").split())
-        return text[:max_len]
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Token count via tiktoken; falls back to ~4 chars/token without an encoding."""
+    enc = _encoding(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+def fetch_url_text(url: str, max_len: Optional[int] = 20000, timeout: int = 15) -> str:
+    """Visible text of `url`; `max_len=None` keeps the whole document.
+
+    The body is streamed through an incremental parser and the download stops
+    as soon as `max_len` characters of text have been collected.
+    """
+    try:
+        with span("summarizer.fetch", url=url) as sp:
+            # Filed documents never change, so a day-long TTL is safe
+            status, headers, chunks = get_client().stream(
+                url, timeout=timeout, ttl=86400,
+                headers={"User-Agent": "AI-Risk-Report/1.0 (contact: you@example.com)"})
+            try:
+                if status >= 400:
+                    raise requests.HTTPError(f"{status} for url: {url}")
+                text = extract_text(decode_chunks(chunks, headers), max_len)
+                sp.add(chars=len(text))
+                return text
+            finally:
+                chunks.close()
     except Exception as e:
         return f"[FETCH_ERROR] {url}: {e}"
 
-def llm_summarize(text: str, url: str, api_key: Optional[str], model: str = "gpt-4o-mini") -> str:
+SYSTEM_PROMPT = "You write concise, factual risk summaries."
+# Bump whenever a prompt below changes so cached summaries are not reused across prompt versions
+PROMPT_VERSION = "2"
+
+def _chat(client, model: str, prompt: str, max_tokens: int) -> str:
+    """One rate-limited chat completion."""
+    with span("summarizer.llm", model=model) as sp:
+        tokens = count_tokens(prompt, model)
+        waited = _rpm_limiter.acquire() + _tpm_limiter.acquire(tokens + max_tokens)
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.2,
+            max_tokens=max_tokens,
+        )
+        sp.add(prompt_tokens=tokens, rate_limit_wait_s=round(waited, 3))
+        return resp.choices[0].message.content.strip()
+
+def llm_summarize(text: str, url: str, api_key: Optional[str], model: str = "gpt-4o-mini",
+                  base_url: Optional[str] = None) -> str:
     """Summarize a disclosure/article into risk-relevant bullets via OpenAI. If no key, return a disabled note."""
     if not api_key:
         return f"- {url}\n  - [LLM disabled] Provide OpenAI API key to enable summaries.\n"
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
+        client = get_openai_client(api_key, base_url)
         prompt = f"""
 You are a risk analyst. Summarize the following disclosure/article into 3-5 concise bullets.
 - Focus on risk-relevant points, numbers, timelines, regulatory/compliance implications.
@@ -31,27 +109,177 @@ TEXT BEGIN
 TEXT END
 Include the source URL inline.
 """
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You write concise, factual risk summaries."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
-            max_tokens=450,
-        )
-        out = resp.choices[0].message.content.strip()
+        out = _chat(client, model, prompt, 450)
         if url not in out:
             out += f"\n(Source: {url})"
         return out
     except Exception as e:
         return f"- {url}\n  - [LLM_ERROR] {e}\n"
 
-def summarize_urls(urls: List[str], api_key: Optional[str], max_items: int = 3) -> str:
-    urls = [u for u in urls if u][:max_items]
-    md_parts = []
-    for u in urls:
-        text = fetch_url_text(u)
-        md = llm_summarize(text, u, api_key=api_key)
-        md_parts.append(md)
+# 10-K/10-Q items that carry most of the risk content, with their ranking bonus
+PRIORITY_ITEMS = {"1A": 3.0, "7A": 2.0, "7": 2.0, "3": 1.0}
+_ITEM_RE = re.compile(r"\bitem\s+(1a|1b|1c|1|2|3|4|5|6|7a|7|8|9a|9)\b[.:\s]", re.IGNORECASE)
+RISK_TERMS = re.compile(
+    r"\b(risk|liquidity|covenant|impair\w*|litigation|default|going concern|material weakness|"
+    r"cyber\w*|regulat\w*|restructur\w*|downgrade|exposure|volatil\w*|breach|sanction\w*|"
+    r"uncertaint\w*|adverse\w*|loss(?:es)?)\b",
+    re.IGNORECASE,
+)
+
+def item_sections(text: str) -> list[tuple[int, int, str]]:
+    """(start, end, item) character spans for 10-K style "Item N" sections.
+
+    Each heading runs to the next one; when an item appears several times (table
+    of contents, cross-references) the longest span is taken as the real section.
+    """
+    hits = [(m.start(), m.group(1).upper()) for m in _ITEM_RE.finditer(text)]
+    best: dict[str, tuple[int, int]] = {}
+    for (pos, item), nxt in zip(hits, hits[1:] + [(len(text), "")]):
+        span = (pos, nxt[0])
+        if item not in best or span[1] - span[0] > best[item][1] - best[item][0]:
+            best[item] = span
+    return sorted((a, b, item) for item, (a, b) in best.items())
+
+def chunk_text(text: str, chunk_tokens: int = 1500, overlap: int = 100,
+               model: str = "gpt-4o-mini") -> list[tuple[int, str]]:
+    """Split into ~`chunk_tokens` token chunks; returns (char offset, chunk text) pairs."""
+    enc = _encoding(model)
+    step = max(1, chunk_tokens - overlap)
+    if enc is None:
+        size, stride = chunk_tokens * 4, step * 4
+        return [(i, text[i:i + size]) for i in range(0, max(len(text), 1), stride)]
+    toks = enc.encode(text, disallowed_special=())
+    chunks, offset = [], 0
+    for i in range(0, max(len(toks), 1), step):
+        piece = enc.decode(toks[i:i + chunk_tokens])
+        chunks.append((offset, piece))
+        offset += len(enc.decode(toks[i:i + step]))
+    return chunks
+
+def rank_chunks(text: str, chunks: list[tuple[int, str]]) -> list[tuple[float, int, str]]:
+    """Score chunks by section (Item 1A, 7, 7A first) plus risk-term density; best first."""
+    sections = item_sections(text)
+    ranked = []
+    for idx, (offset, piece) in enumerate(chunks):
+        item = next((it for a, b, it in sections if a <= offset < b), None)
+        density = len(RISK_TERMS.findall(piece)) / max(len(piece.split()), 1)
+        score = PRIORITY_ITEMS.get(item, 0.0) + 20.0 * density
+        ranked.append((score, idx, item or ""))
+    ranked.sort(key=lambda r: (-r[0], r[1]))
+    return ranked
+
+def llm_summarize_long(text: str, url: str, api_key: Optional[str], model: str = "gpt-4o-mini",
+                       base_url: Optional[str] = None, chunk_tokens: int = 1500,
+                       token_budget: int = 24000, map_workers: int = 4) -> str:
+    """Map-reduce summary of a whole filing instead of its first 6,000 characters.
+
+    The document is cut into token-budgeted chunks, ranked so Item 1A / MD&A and
+    risk-dense passages come first, and the best chunks are summarized in
+    parallel until `token_budget` input tokens are spent. A reduce call merges
+    the partial notes (in document order) into the final bullets.
+    """
+    if not api_key:
+        return llm_summarize(text, url, api_key, model, base_url)
+    if text.startswith("[FETCH_ERROR]") or count_tokens(text, model) <= chunk_tokens:
+        return llm_summarize(text, url, api_key, model, base_url)
+    try:
+        client = get_openai_client(api_key, base_url)
+        chunks = chunk_text(text, chunk_tokens, model=model)
+        picked, spent = [], 0
+        for score, idx, item in rank_chunks(text, chunks):
+            cost = count_tokens(chunks[idx][1], model)
+            if spent + cost > token_budget:
+                break
+            picked.append((idx, item))
+            spent += cost
+
+        def map_one(idx: int, item: str) -> str:
+            label = f"Item {item}" if item else "other"
+            prompt = f"""
+Extract the risk-relevant facts from this excerpt of a filing (section: {label}) as 2-5 terse bullets.
+Keep numbers, dates and named exposures; skip boilerplate. Reply "none" if nothing is risk-relevant.
+TEXT BEGIN
+{chunks[idx][1]}
+TEXT END
+"""
+            return _chat(client, model, prompt, 250)
+
+        # submitted best-first so the risk sections are summarized before the rest
+        with ThreadPoolExecutor(max_workers=map_workers) as pool:
+            futs = [(idx, item, pool.submit(bind(map_one), idx, item)) for idx, item in picked]
+            notes = sorted((idx, item, f.result()) for idx, item, f in futs)
+        notes = [(idx, item, n) for idx, item, n in notes if n.strip().lower().rstrip(".") != "none"]
+
+        merged = "\n".join(f"[{'Item ' + item if item else 'part ' + str(idx)}]\n{n}" for idx, item, n in notes)
+        prompt = f"""
+You are a risk analyst. Below are notes taken from different sections of one filing.
+Merge them into 3-5 concise bullets covering the most material risks.
+- Focus on risk-relevant points, numbers, timelines, regulatory/compliance implications.
+- Keep it factual; avoid speculation; drop duplicates.
+- End with a one-line takeaway.
+NOTES BEGIN
+{merged}
+NOTES END
+Include the source URL inline: {url}
+"""
+        out = _chat(client, model, prompt, 450)
+        if url not in out:
+            out += f"\n(Source: {url})"
+        return out + f"\n_(map-reduce: {len(picked)}/{len(chunks)} chunks, ~{spent:,} input tokens)_"
+    except Exception as e:
+        return f"- {url}\n  - [LLM_ERROR] {e}\n"
+
+def summarize_cached(text: str, url: str, api_key: Optional[str], model: str = "gpt-4o-mini",
+                     base_url: Optional[str] = None, mode: str = "truncate", token_budget: int = 24000) -> str:
+    """`llm_summarize` / `llm_summarize_long` behind the content-addressed summary cache.
+
+    Only real summaries are stored; fetch errors, LLM errors and the
+    no-key note always go through uncached.
+    """
+    if not api_key or text.startswith("[FETCH_ERROR]"):
+        return llm_summarize(text, url, api_key, model, base_url)
+    cache = get_summary_cache()
+    version = f"{PROMPT_VERSION}:{mode}:{token_budget if mode == 'mapreduce' else ''}"
+    key = cache.key(text, model, version)
+    out = cache.get(key)
+    if out is not None:
+        # same content may have been summarized under another URL
+        return out if url in out else out + f"\n(Source: {url})"
+    if mode == "mapreduce":
+        out = llm_summarize_long(text, url, api_key, model, base_url, token_budget=token_budget)
+    else:
+        out = llm_summarize(text, url, api_key, model, base_url)
+    if "[LLM_ERROR]" not in out:
+        cache.put(key, out)
+    return out
+
+@traced("summarizer.summarize_urls")
+def summarize_urls(urls: List[str], api_key: Optional[str], max_items: int = 3, model: str = "gpt-4o-mini",
+                   fetch_workers: int = 4, llm_workers: int = 3, base_url: Optional[str] = None,
+                   mode: str = "truncate", token_budget: int = 24000) -> str:
+    """Fetch and summarize `urls` as a two-stage pipeline; output keeps the input order.
+
+    Each document is handed to the LLM stage as soon as its fetch finishes, so
+    completions overlap with the remaining downloads. Both stages are bounded;
+    the LLM stage also respects the shared RPM/TPM limits. `mode="mapreduce"`
+    reads whole documents and summarizes them with `llm_summarize_long`.
+    URLs that differ only by tracking params are fetched once, and summaries
+    of already-seen content come from the summary cache.
+    """
+    urls = get_summary_cache().dedupe_urls([u for u in urls if u])[:max_items]
+    if not urls:
+        return ""
+    record(rows=len(urls))
+    max_len = None if mode == "mapreduce" else 20000
+    md_parts: list = [None] * len(urls)
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+         ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+        fetches = {fetch_pool.submit(bind(fetch_url_text), u, max_len): i for i, u in enumerate(urls)}
+        summaries = {}
+        for fut in as_completed(fetches):
+            i = fetches[fut]
+            summaries[llm_pool.submit(bind(summarize_cached), fut.result(), urls[i], api_key, model, base_url,
+                                      mode, token_budget)] = i
+        for fut, i in summaries.items():
+            md_parts[i] = fut.result()
     return "\n\n".join(md_parts)
@@ -0,0 +1,117 @@
+import hashlib, os, sqlite3, threading, time
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CACHE_PATH = os.getenv("RISK_SUMMARY_CACHE",
+                       os.path.join(os.path.expanduser("~"), ".ai_risk_report", "summaries.sqlite"))
+
+TRACKING_PARAMS = {"gclid", "fbclid", "mc_cid", "mc_eid", "ref_src", "cmpid", "ocid", "igshid"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form for dedup: lower-case host, no fragment, no tracking params, sorted query."""
+    p = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+                   if not (k.lower().startswith("utm_") or k.lower() in TRACKING_PARAMS))
+    path = p.path.rstrip("/") or "/"
+    return urlunsplit((p.scheme.lower(), p.netloc.lower(), path, urlencode(query), ""))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class SummaryCache:
+    """Content-addressed SQLite store of LLM summaries with size-bounded LRU eviction.
+
+    Keys hash the normalised document text together with the model and prompt
+    version, so the same filing reached through a mirror or a tracking link is
+    summarised once, and a prompt change invalidates old entries.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = 50 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "duplicate_urls": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._db() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL,
+                created REAL NOT NULL, last_access REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON summaries(last_access)")
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # commit on success, roll back on error
+                yield db
+        finally:
+            db.close()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    @staticmethod
+    def key(text: str, model: str, prompt_version: str) -> str:
+        h = hashlib.sha256()
+        for part in (prompt_version, model, normalize_text(text)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock, self._db() as db:
+            row = db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row:
+                db.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.stats["hits"] += 1
+                return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, summary: str) -> None:
+        size = len(summary.encode("utf-8"))
+        now = time.time()
+        with self._lock, self._db() as db:
+            db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)", (key, summary, size, now, now))
+            self.stats["stored"] += 1
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+            if total > self.max_bytes:
+                # drop least-recently used entries until back under the cap
+                for k, sz in db.execute("SELECT key, size FROM summaries ORDER BY last_access").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM summaries WHERE key = ?", (k,))
+                    total -= sz
+                    self.stats["evicted"] += 1
+
+    def dedupe_urls(self, urls: list[str]) -> list[str]:
+        """Drop URLs that normalise to one already in the list (order kept)."""
+        seen, out = set(), []
+        for u in urls:
+            n = normalize_url(u)
+            if n in seen:
+                self._count("duplicate_urls")
+                continue
+            seen.add(n)
+            out.append(u)
+        return out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+_default_cache: SummaryCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SummaryCache()
+        return _default_cache
@@ -1,66 +1,344 @@
+import math
 import numpy as np
 import pandas as pd
 
-def compute_risk_metrics(prices: pd.DataFrame) -> dict:
+from scenarios import uniform_shocks, beta_shocks, historical_library, revalue
+from correlation import pairwise_corr
+from instrumentation import traced, record
+
+def risk_metrics_matrix(values: np.ndarray, ann_factor: float = 252.0, dtype=np.float64) -> dict:
+    """Single-pass, NaN-aware metrics over a (T, N) price matrix.
+
+    Missing prices are handled per column: a return exists only where both the
+    price and the previous price are present, so a late listing shortens its own
+    history and nobody else's. Peak memory is a few (T, N) buffers of `dtype`
+    (pass np.float32 to halve it).
+    """
+    p = np.asarray(values, dtype=dtype)
+    T, N = p.shape
+    cols = np.arange(N)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = np.full((T, N), np.nan, dtype=dtype)
+        np.divide(p[1:], p[:-1], out=rets[1:])
+        rets[1:] -= 1.0
+        valid = ~np.isnan(rets)
+        n_obs = valid.sum(axis=0)
+
+        # Two-pass mean/variance over each column's own observations
+        buf = np.where(valid, rets, 0.0).astype(dtype, copy=False)
+        mean = buf.sum(axis=0) / n_obs
+        np.subtract(buf, mean, out=buf)
+        buf[~valid] = 0.0
+        std = np.sqrt(np.einsum("ij,ij->j", buf, buf) / (n_obs - 1))
+        vol = std * np.sqrt(ann_factor)
+        sharpe = mean / std * np.sqrt(ann_factor)
+
+        # Drawdown from the running max (fmax skips gaps inside a column)
+        run = np.fmax.accumulate(p, axis=0)
+        np.divide(p, run, out=buf)
+        buf -= 1.0
+        buf[np.isnan(buf)] = 0.0  # drawdowns are <= 0, so gaps cannot win the argmin
+        has_px = ~np.isnan(run[-1])
+        trough = buf.argmin(axis=0)
+        mdd = np.where(has_px, buf[trough, cols], np.nan)
+        # Peak = first time the running max reached its value at the trough
+        peak_px = run[trough, cols]
+        peak = np.isnan(run).sum(axis=0) + (run < peak_px).sum(axis=0)
+
+    return {
+        "returns": rets,
+        "n_obs": n_obs,
+        "mean": mean,
+        "ann_vol": vol,
+        "sharpe": sharpe,
+        "mdd": mdd,
+        "mdd_peak": np.where(has_px, peak, -1),
+        "mdd_trough": np.where(has_px, trough, -1),
+    }
+
+@traced("utils.compute_risk_metrics")
+def compute_risk_metrics(prices: pd.DataFrame, dtype=np.float64) -> dict:
     """Core risk metrics for individual tickers."""
-    rets = prices.pct_change().dropna()
+    record(rows=len(prices))
     ann_factor = 252.0
-    vol = rets.std() * np.sqrt(ann_factor)
-    sharpe = rets.mean() / rets.std() * np.sqrt(ann_factor)
-    # Max drawdown per-asset
-    mdd = {}
-    for c in prices.columns:
-        x = prices[c].dropna()
-        cummax = x.cummax()
-        dd = (x / cummax - 1.0).min()
-        mdd[c] = float(dd)
-    corr = rets.corr()
+    m = risk_metrics_matrix(prices.to_numpy(dtype=dtype, na_value=np.nan), ann_factor, dtype)
+    cols, idx = prices.columns, prices.index
+    rets = pd.DataFrame(m["returns"][1:], index=idx[1:], columns=cols)
+    dates = lambda pos: pd.Series(idx.take(np.maximum(pos, 0)), index=cols).where(pos >= 0)
+    # Blockwise float32, pairwise-complete (same definition as rets.corr(), far cheaper at large N)
+    corr = pd.DataFrame(pairwise_corr(m["returns"][1:]), index=cols, columns=cols)
     return {
         "returns": rets,
-        "ann_vol": vol.sort_values(ascending=False),
-        "sharpe": sharpe.sort_values(ascending=False),
-        "mdd": pd.Series(mdd).sort_values(),
+        "n_obs": pd.Series(m["n_obs"], index=cols),
+        "mean": pd.Series(m["mean"], index=cols),
+        "ann_vol": pd.Series(m["ann_vol"], index=cols).sort_values(ascending=False),
+        "sharpe": pd.Series(m["sharpe"], index=cols).sort_values(ascending=False),
+        "mdd": pd.Series(m["mdd"], index=cols).sort_values(),
+        "mdd_peak": dates(m["mdd_peak"]),
+        "mdd_trough": dates(m["mdd_trough"]),
         "corr": corr,
     }
 
-def compute_portfolio_returns(prices: pd.DataFrame, weights: pd.Series | None = None) -> pd.Series:
-    """Equal-weight portfolio daily returns unless weights provided."""
-    rets = prices.pct_change().dropna()
+@traced("utils.compute_portfolio_returns")
+def compute_portfolio_returns(prices: pd.DataFrame, weights: pd.Series | pd.DataFrame | None = None):
+    """Equal-weight portfolio daily returns unless weights provided.
+
+    `weights` may also be a (ticker x portfolio) matrix; all portfolios are then
+    computed in one matrix product and a (date x portfolio) DataFrame is returned.
+    Gaps inside a ticker's history are forward-filled. Before a ticker's first
+    price the day's return comes from the tickers that have one, scaled back
+    up to the portfolio's gross weight, so a late listing does not cut every
+    portfolio's history short.
+    """
+    record(rows=len(prices))
+    rets = prices.ffill().pct_change(fill_method=None).iloc[1:]
     if weights is None:
         weights = pd.Series(1.0/len(rets.columns), index=rets.columns)
-    weights = weights.reindex(rets.columns).fillna(0.0)
-    port = rets.dot(weights)
-    return port
+    single = not isinstance(weights, pd.DataFrame)
+    W = (weights.to_frame("Portfolio") if single else weights).reindex(rets.columns).fillna(0.0)
+    R = rets.to_numpy(dtype=float)
+    w = W.to_numpy(dtype=float)
+    has = ~np.isnan(R)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.abs(w).sum(axis=0) / (has @ np.abs(w))
+    port = np.where(has, R, 0.0) @ w * np.where(np.isfinite(scale), scale, np.nan)
+    out = pd.DataFrame(port, index=rets.index, columns=W.columns)
+    out = out.dropna(how="all")
+    if single:
+        return out.iloc[:, 0].rename(None)
+    return out
+
+def load_weights_csv(src) -> pd.DataFrame:
+    """Read portfolio weights into a (ticker x portfolio) matrix.
+
+    Wide files have tickers in the first column and one column per portfolio;
+    long files have `portfolio`, `ticker` and `weight` columns (any order/case).
+    """
+    df = pd.read_csv(src)
+    cols = {str(c).strip().lower(): c for c in df.columns}
+    if {"portfolio", "ticker", "weight"} <= set(cols):
+        df = df.rename(columns={cols[k]: k for k in ("portfolio", "ticker", "weight")})
+        df["ticker"] = df["ticker"].astype(str).str.strip().str.upper()
+        df["weight"] = pd.to_numeric(df["weight"], errors="coerce")
+        W = df.pivot_table(index="ticker", columns="portfolio", values="weight", aggfunc="sum", fill_value=0.0)
+    else:
+        if df.shape[1] < 2:
+            raise ValueError("Weights CSV needs a ticker column and at least one portfolio column.")
+        W = df.set_index(df.columns[0])
+        W.index = W.index.astype(str).str.strip().str.upper()
+        W = W.apply(pd.to_numeric, errors="coerce").fillna(0.0).groupby(level=0).sum()
+    if W.empty:
+        raise ValueError("No weights found in the CSV.")
+    W.index.name = "Ticker"
+    W.columns = W.columns.astype(str)
+    W.columns.name = "Portfolio"
+    return W.astype(float)
 
-def var_es(port_rets: pd.Series, alphas=(0.95, 0.99)) -> pd.DataFrame:
-    """Historical-simulation VaR/ES on daily returns; outputs positive loss numbers."""
+def _sorted_quantile(x: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+    """Column quantiles (linear, as np.quantile) of an ascending-sorted matrix whose NaNs sit at the bottom."""
+    h = np.maximum(n - 1, 0) * q
+    lo = np.floor(h).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    cols = np.arange(x.shape[1])
+    v = x[lo, cols] + (h - lo) * (x[hi, cols] - x[lo, cols])
+    return np.where(n > 0, v, np.nan)
+
+@traced("utils.var_es")
+def var_es(port_rets: pd.Series | pd.DataFrame, alphas=(0.95, 0.99)) -> pd.DataFrame:
+    """Historical-simulation VaR/ES on daily returns; outputs positive loss numbers.
+
+    A (date x portfolio) DataFrame is evaluated for every portfolio at once;
+    the result has one column per portfolio.
+    """
+    record(rows=len(port_rets))
+    frame = port_rets.to_frame("Portfolio") if isinstance(port_rets, pd.Series) else port_rets
     out = {}
-    losses = -port_rets.dropna()  # positive = loss
+    if not len(frame):
+        for a in alphas:
+            out[f"VaR@{int(a*100)}"] = out[f"ES@{int(a*100)}"] = np.full(frame.shape[1], np.nan)
+        return pd.DataFrame(out, index=frame.columns).T
+    losses = np.sort(-frame.to_numpy(dtype=float), axis=0)  # positive = loss, NaN sorted last
+    n = (~np.isnan(losses)).sum(axis=0)
+    cols = np.arange(losses.shape[1])
+    # Sort once; every alpha reads its quantile and tail mean off the same array
+    tail_sums = np.cumsum(np.nan_to_num(losses)[::-1], axis=0)[::-1]  # tail_sums[i] = sum(losses[i:])
     for a in alphas:
-        var = losses.quantile(a)
-        tail = losses[losses >= var]
-        es = tail.mean() if len(tail) else float("nan")
+        var = _sorted_quantile(losses, n, a)
+        i = (losses < var).sum(axis=0)  # first position with loss >= VaR
+        with np.errstate(invalid="ignore", divide="ignore"):
+            es = np.where(i < n, tail_sums[np.minimum(i, len(losses) - 1), cols] / (n - i), np.nan)
         out[f"VaR@{int(a*100)}"] = var
         out[f"ES@{int(a*100)}"] = es
-    return pd.DataFrame(out, index=["Portfolio"]).T
+    return pd.DataFrame(out, index=frame.columns).T
 
-def stress_scenarios(prices: pd.DataFrame, weights: pd.Series | None = None, shocks=(-0.05, -0.10, -0.20)) -> pd.DataFrame:
-    """Uniform equity shocks (-5%, -10%, -20%). Returns portfolio P&L (%) per shock."""
+def _xlogy(x: float, y: float) -> float:
+    return 0.0 if x == 0 else x * np.log(y)
+
+def _chi2_sf(lr: float, df: int) -> float:
+    """Chi-square survival function for the 1- and 2-dof backtest statistics."""
+    if not np.isfinite(lr):
+        return float("nan")
+    return math.erfc(math.sqrt(lr / 2.0)) if df == 1 else math.exp(-lr / 2.0)
+
+def var_breach_stats(hits: np.ndarray, alpha: float) -> dict:
+    """Kupiec POF and Christoffersen independence / conditional-coverage tests."""
+    hits = np.asarray(hits, dtype=bool)
+    n, x = len(hits), int(hits.sum())
+    p = 1.0 - alpha
+    out = {"Obs": n, "Breaches": x, "Expected": n * p, "Rate": x / n if n else np.nan}
+    if n == 0:
+        return out
+    lr_pof = -2.0 * (_xlogy(n - x, 1 - p) + _xlogy(x, p) - _xlogy(n - x, 1 - x / n) - _xlogy(x, x / n))
+    prev, cur = hits[:-1], hits[1:]
+    n00 = int(np.sum(~prev & ~cur)); n01 = int(np.sum(~prev & cur))
+    n10 = int(np.sum(prev & ~cur)); n11 = int(np.sum(prev & cur))
+    pi0 = n01 / (n00 + n01) if n00 + n01 else 0.0
+    pi1 = n11 / (n10 + n11) if n10 + n11 else 0.0
+    pi = (n01 + n11) / max(n00 + n01 + n10 + n11, 1)
+    lr_ind = -2.0 * (_xlogy(n00 + n10, 1 - pi) + _xlogy(n01 + n11, pi)
+                     - _xlogy(n00, 1 - pi0) - _xlogy(n01, pi0) - _xlogy(n10, 1 - pi1) - _xlogy(n11, pi1))
+    # LRs are >= 0 in theory; clip rounding noise (and -0.0) so the table reads cleanly
+    lr_pof, lr_ind = max(0.0, lr_pof), max(0.0, lr_ind)
+    out.update({
+        "Kupiec LR": lr_pof, "Kupiec p": _chi2_sf(lr_pof, 1),
+        "Christoffersen LR": lr_ind, "Christoffersen p": _chi2_sf(lr_ind, 1),
+        "CC LR": lr_pof + lr_ind, "CC p": _chi2_sf(lr_pof + lr_ind, 2),
+    })
+    return out
+
+@traced("utils.rolling_var_es")
+def rolling_var_es(port_rets: pd.Series, window: int = 250, alphas=(0.95, 0.99),
+                   chunk: int = 2048) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Rolling historical VaR/ES for several alphas plus breach backtests.
+
+    Windows are strided views over the loss series; each chunk of windows is
+    partitioned once at every quantile position needed by `alphas` (no per-window
+    sort). Row t holds the estimate from the `window` losses ending at t and is
+    compared against the realised loss at t+1 for the Kupiec/Christoffersen stats.
+    Returns (time series, backtest table).
+    """
+    record(rows=len(port_rets))
+    losses = -port_rets.dropna()  # positive = loss
+    x = losses.to_numpy(dtype=float)
+    if len(x) < window:
+        return pd.DataFrame(), pd.DataFrame()
+
+    alphas = np.asarray(alphas, dtype=float)
+    h = (window - 1) * alphas  # same linear interpolation as Series.quantile
+    lo = np.floor(h).astype(int)
+    hi = np.ceil(h).astype(int)
+    frac = h - lo
+    kth = np.unique(np.concatenate([lo, hi]))
+
+    wins = np.lib.stride_tricks.sliding_window_view(x, window)
+    n_win = len(wins)
+    var = np.empty((n_win, len(alphas)))
+    es = np.empty((n_win, len(alphas)))
+    for i in range(0, n_win, chunk):
+        part = np.partition(wins[i:i + chunk], kth, axis=1)
+        for k in range(len(alphas)):
+            q = part[:, lo[k]] + frac[k] * (part[:, hi[k]] - part[:, lo[k]])
+            # the whole window, not just right of the quantile: losses tied with VaR can sit left of it
+            mask = part >= q[:, None]
+            var[i:i + chunk, k] = q
+            es[i:i + chunk, k] = (part * mask).sum(axis=1) / mask.sum(axis=1)
+
+    cols = {}
+    for k, a in enumerate(alphas):
+        cols[f"VaR@{int(a*100)}"] = var[:, k]
+        cols[f"ES@{int(a*100)}"] = es[:, k]
+    ts = pd.DataFrame(cols, index=losses.index[window - 1:])
+    ts["Next-day loss"] = np.append(x[window:], np.nan)
+
+    realised = x[window:]
+    stats = {f"VaR@{int(a*100)}": var_breach_stats(realised > var[:-1, k], a) for k, a in enumerate(alphas)}
+    return ts, pd.DataFrame(stats).T
+
+@traced("utils.stress_scenarios")
+def stress_scenarios(prices: pd.DataFrame, weights: pd.Series | pd.DataFrame | None = None,
+                     shocks=(-0.05, -0.10, -0.20), market_shocks=(-0.10, -0.20),
+                     library: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Revalue the portfolio(s) under uniform, beta-scaled and historical-replay shocks.
+
+    Returns portfolio P&L (%) per scenario. `library` is a (scenario x ticker)
+    table of replay returns, e.g. `scenarios.library_from_store`; by default the
+    replay windows covered by `prices` itself are used.
+    """
+    record(rows=len(prices))
     if weights is None:
         weights = pd.Series(1.0/len(prices.columns), index=prices.columns)
-    weights = weights.reindex(prices.columns).fillna(0.0)
-    res = {}
-    for s in shocks:
-        res[f"Shock {int(s*100)}%"] = pd.Series({"Portfolio": s*100.0})
-    df = pd.DataFrame(res).T
-    return df
-
-def historical_worst_days(port_rets: pd.Series, k: int = 5) -> pd.DataFrame:
-    """Worst k daily returns; include percentage loss."""
-    w = port_rets.nsmallest(k).to_frame(name="Return")
+    rets = prices.pct_change(fill_method=None).iloc[1:]
+    if library is None:
+        library = historical_library(prices)
+    matrix = pd.concat([
+        uniform_shocks(prices.columns, shocks),
+        beta_shocks(rets, market_shocks),
+        library.reindex(columns=prices.columns),
+    ])
+    return revalue(matrix, weights)
+
+@traced("utils.historical_worst_days")
+def historical_worst_days(port_rets: pd.Series | pd.DataFrame, k: int = 5) -> pd.DataFrame:
+    """Worst k daily returns; include percentage loss.
+
+    For a (date x portfolio) DataFrame the result is long: one row per
+    portfolio and rank, selected with a single partition over the date axis.
+    """
+    record(rows=len(port_rets))
+    if isinstance(port_rets, pd.Series):
+        w = port_rets.nsmallest(k).to_frame(name="Return")
+        w["Loss(%)"] = -w["Return"]*100.0
+        return w
+    R = np.nan_to_num(port_rets.to_numpy(dtype=float), nan=np.inf)
+    k = min(k, len(R))
+    if k == 0:
+        return pd.DataFrame(columns=["Portfolio", "Rank", "Date", "Return", "Loss(%)"])
+    idx = np.argpartition(R, k - 1, axis=0)[:k]
+    idx = np.take_along_axis(idx, np.argsort(np.take_along_axis(R, idx, axis=0), axis=0, kind="stable"), axis=0)
+    vals = np.take_along_axis(R, idx, axis=0)
+    P = R.shape[1]
+    w = pd.DataFrame({
+        "Portfolio": np.tile(port_rets.columns.to_numpy(), k),
+        "Rank": np.repeat(np.arange(1, k + 1), P),
+        "Date": port_rets.index.to_numpy()[idx.ravel()],
+        "Return": vals.ravel(),
+    })
+    w = w[np.isfinite(w["Return"])].sort_values(["Portfolio", "Rank"], kind="stable").reset_index(drop=True)
     w["Loss(%)"] = -w["Return"]*100.0
     return w
 
+@traced("utils.portfolio_summary")
+def portfolio_summary(port_rets: pd.Series | pd.DataFrame, alphas=(0.95, 0.99)) -> pd.DataFrame:
+    """Tidy per-portfolio table: volatility, Sharpe, VaR/ES, max drawdown and worst day.
+
+    Every column is computed for all portfolios in one vectorised pass; the
+    drawdown runs on each portfolio's wealth curve via `risk_metrics_matrix`.
+    """
+    record(rows=len(port_rets))
+    frame = port_rets.to_frame("Portfolio") if isinstance(port_rets, pd.Series) else port_rets
+    R = frame.to_numpy(dtype=float)
+    wealth = np.vstack([np.ones((1, R.shape[1])), np.cumprod(1.0 + np.nan_to_num(R), axis=0)])
+    wealth[1:][np.isnan(R)] = np.nan
+    m = risk_metrics_matrix(wealth)
+    # wealth row 0 is the starting value; it is dated with the first return
+    day = lambda pos: np.where(pos >= 0, frame.index.to_numpy()[np.clip(pos - 1, 0, None)],
+                               np.datetime64("NaT")) if len(frame) else pd.NaT
+    worst = np.nan_to_num(R, nan=np.inf).argmin(axis=0) if len(R) else np.zeros(R.shape[1], dtype=int)
+    cols = np.arange(R.shape[1])
+    out = pd.DataFrame({
+        "Obs": m["n_obs"],
+        "Ann. Vol": m["ann_vol"],
+        "Sharpe": m["sharpe"],
+    }, index=frame.columns)
+    out = out.join(var_es(frame, alphas).T)
+    out["Max Drawdown"] = m["mdd"]
+    out["Peak"] = day(m["mdd_peak"])
+    out["Trough"] = day(m["mdd_trough"])
+    out["Worst Day"] = R[worst, cols] if len(R) else np.nan
+    out["Worst Day Date"] = frame.index.to_numpy()[worst] if len(R) else pd.NaT
+    out.index.name = "Portfolio"
+    return out
+
 def to_markdown_table(df: pd.DataFrame, title: str) -> str:
     if df is None or df.empty:
         return f"### {title}\n_No data_\n"